@@ -0,0 +1,78 @@
+import numpy as np
+from cache import TTLCache
+from config import Config
+from regrade import answer_matrix
+from repository import submissions, quiz_stats
+
+def item_analysis(matrix, answer_key, option_counts):
+    # matrix is students x questions of chosen option indexes (-1 = unanswered)
+    students, questions = matrix.shape
+    key = np.asarray(answer_key, dtype=matrix.dtype)
+    correct = (matrix == key).astype(np.float64)
+    p_values = correct.mean(axis=0) if students else np.zeros(questions)
+
+    # Point-biserial of each item against the rest of the test (total score minus the item itself)
+    rest = correct.sum(axis=1, keepdims=True) - correct
+    if students:
+        item_dev = correct - correct.mean(axis=0)
+        rest_dev = rest - rest.mean(axis=0)
+        covariance = (item_dev * rest_dev).mean(axis=0)
+        spread = item_dev.std(axis=0) * rest_dev.std(axis=0)
+        discrimination = np.divide(covariance, spread, out=np.zeros(questions), where=spread > 0)
+    else:
+        discrimination = np.zeros(questions)
+
+    # Option histogram per question; column 0 counts unanswered or out-of-range choices
+    width = max(option_counts, default=0) + 1
+    choices = matrix + 1
+    valid = (choices >= 1) & (choices <= np.asarray(option_counts)[None, :])
+    choices = np.where(valid, choices, 0)
+    flat = (np.arange(questions)[None, :] * width + choices).ravel()
+    histogram = np.bincount(flat, minlength=questions * width).reshape(questions, width)
+
+    return p_values, discrimination, histogram
+
+analysis_cache = TTLCache("item_analysis", maxsize=Config.ANALYSIS_CACHE_SIZE)
+
+async def get_item_analysis(quiz):
+    # Cached until the quiz is edited or another submission arrives
+    stats = (await quiz_stats.for_quizzes([quiz.id])).get(quiz.id)
+    submission_count = stats.count if stats else await submissions.count_for_quiz(quiz.id)
+    cache_key = (quiz.version or 0, submission_count)
+    cached = analysis_cache.get(quiz.id)
+    if cached is not None and cached[0] == cache_key:
+        return cached[1]
+
+    question_count = len(quiz.questions)
+    blocks = [
+        answer_matrix(batch, question_count)
+        async for batch in submissions.iter_answer_batches(quiz.id, batch_size=Config.REGRADE_BATCH_SIZE)
+    ]
+    matrix = np.vstack(blocks) if blocks else np.empty((0, question_count), dtype=np.int32)
+    answer_key = [q.correct_option for q in quiz.questions]
+    option_counts = [len(q.options) for q in quiz.questions]
+    p_values, discrimination, histogram = item_analysis(matrix, answer_key, option_counts)
+
+    students = matrix.shape[0]
+    items = []
+    for index, question in enumerate(quiz.questions):
+        counts = histogram[index]
+        items.append({
+            "number": index + 1,
+            "text": question.text,
+            "p_value": round(float(p_values[index]), 3),
+            "discrimination": round(float(discrimination[index]), 3),
+            "unanswered": int(counts[0]),
+            "options": [
+                {
+                    "text": option,
+                    "count": int(counts[choice + 1]),
+                    "share": round(100 * int(counts[choice + 1]) / students, 1) if students else 0,
+                    "is_correct": choice == question.correct_option,
+                }
+                for choice, option in enumerate(question.options)
+            ],
+        })
+    result = {"students": students, "items": items}
+    analysis_cache.set(quiz.id, (cache_key, result))
+    return result
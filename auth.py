@@ -6,16 +6,13 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import APIKeyCookie, OAuth2PasswordBearer
+from repository import users
 from models import User
+from config import Config
+from pool import BoundedPool, PoolBusy
+from cache import TTLCache
+import time
 from mongoengine.errors import DoesNotExist
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-SECRET_KEY = str(os.getenv("SECRET_KEY"))
-ALGORITHM = str(os.getenv("ALGORITHM"))
-ACCESS_TOKEN_EXPIRE_HOURS = int(os.getenv("ACCESS_TOKEN_EXPIRE_HOURS", 24))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -28,10 +25,67 @@ def get_password_hash(password: str) -> str:
     prehashed = hashlib.sha256(password.encode("utf-8")).digest()  
     return bcrypt.hashpw(prehashed, bcrypt.gensalt(rounds=12)).decode("utf-8")
 
+hash_pool = BoundedPool(
+    "bcrypt",
+    kind=Config.HASH_POOL_KIND,
+    max_workers=Config.HASH_POOL_WORKERS,
+    max_queue=Config.HASH_POOL_MAX_QUEUE,
+)
+
+def _server_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again shortly",
+        headers={"Retry-After": str(Config.HASH_POOL_RETRY_AFTER)},
+    )
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return await hash_pool.run(verify_password, plain_password, hashed_password)
+    except PoolBusy:
+        raise _server_busy()
+
+async def get_password_hash_async(password: str) -> str:
+    try:
+        return await hash_pool.run(get_password_hash, password)
+    except PoolBusy:
+        raise _server_busy()
+
 def create_access_token(email: str, expires_delta: Optional[timedelta] = None) -> str:
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS))
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(hours=Config.ACCESS_TOKEN_EXPIRE_HOURS))
     to_encode = {"exp": expire, "sub": email}
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(to_encode, Config.SECRET_KEY, algorithm=Config.ALGORITHM)
+
+# Decoded token -> subject, so repeat requests with the same cookie skip signature checks
+token_cache = TTLCache("token", maxsize=Config.TOKEN_CACHE_SIZE)
+# Token subject -> the user fields routes need; hashed_password is never cached
+user_cache = TTLCache("user", maxsize=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+
+def invalidate_user(email: str):
+    user_cache.pop(email)
+
+def _decode_subject(token: str) -> Optional[str]:
+    email = token_cache.get(token)
+    if email is not None:
+        return email
+    payload = jwt.decode(token, Config.SECRET_KEY, algorithms=[Config.ALGORITHM])
+    email = payload.get("sub")
+    if email is None:
+        return None
+    exp = payload.get("exp")
+    token_cache.set(token, email, ttl=exp - time.time() if exp is not None else None)
+    return email
+
+async def _resolve_user(email: str):
+    user = user_cache.get(email)
+    if user is not None:
+        return user
+    user = await users.get(email=email)
+    if user is None:
+        return None
+    user = User(id=user.id, email=user.email, name=user.name, role=user.role, school_id=user.school_id)
+    user_cache.set(email, user)
+    return user
 
 access_token_cookie = APIKeyCookie(
     name="access_token",
@@ -56,14 +110,13 @@ async def get_current_user(
     )
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
+        email = _decode_subject(token)
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    user = User.objects(email=email).first()
+    user = await _resolve_user(email)
     if user is None:
         raise credentials_exception
     
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from datetime import datetime
+from itertools import islice
+from config import Config
+from metrics import Counter, Gauge, Histogram
+from repository import drafts
+
+logger = logging.getLogger(__name__)
+
+autosave_received = Counter("autosave_answers_received_total", "Answer changes received by autosave")
+autosave_written = Counter("autosave_drafts_written_total", "Draft upserts sent to the database")
+autosave_pending = Gauge("autosave_pending_drafts", "Drafts with changes waiting to be flushed")
+autosave_flush_seconds = Histogram("autosave_flush_seconds", "Time spent in a single draft flush")
+
+# Coalesces autosaved answers per (quiz, student) and flushes them as batched upserts.
+# However often a page autosaves, each draft is written at most once per flush
+# interval; more than max_pending dirty drafts triggers an early flush.
+class DraftBuffer:
+    def __init__(self, flush_interval=2.0, max_pending=5000, batch_size=1000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.pending = {}
+        self.discarded = set()
+        # Taken out of pending and discarded by the flush that is writing them
+        self.flushing = {}
+        self.deleting = set()
+        # Held by a flush; drop_answer waits for it so in-flight drafts are shifted too
+        self._lock = asyncio.Lock()
+        self._wake = None
+        self._stopping = False
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Flush buffered drafts before the lifespan closes the database
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+
+    async def record(self, quiz_id, student_email, answers):
+        key = (quiz_id, student_email)
+        autosave_received.inc(len(answers))
+        if self._task is None:
+            await drafts.upsert_many({key: answers}, datetime.utcnow())
+            autosave_written.inc()
+            return
+        self.discarded.discard(key)
+        self.pending.setdefault(key, {}).update(answers)
+        autosave_pending.set(len(self.pending))
+        if len(self.pending) >= self.max_pending:
+            self._wake.set()
+
+    async def answers_for(self, quiz_id, student_email):
+        # Stored draft with the changes being flushed and those not yet flushed on top.
+        # The in-flight changes are read first: the flush may finish while the draft is loading
+        key = (quiz_id, student_email)
+        if key in self.discarded or key in self.deleting:
+            answers = {}
+        else:
+            flushing = self.flushing.get(key, {})
+            answers = await drafts.answers_for(quiz_id, student_email)
+            answers.update(flushing)
+        answers.update(self.pending.get(key, {}))
+        return answers
+
+    async def discard(self, quiz_id, student_email):
+        key = (quiz_id, student_email)
+        if self._task is None:
+            await drafts.delete_many([key])
+            return
+        self.pending.pop(key, None)
+        self.discarded.add(key)
+        autosave_pending.set(len(self.pending))
+
+    async def drop_answer(self, quiz_id, index):
+        # A question was deleted: later answers move down one position, as in the stored drafts.
+        # A flush already writing the old positions finishes first and is shifted with them
+        for (pending_quiz, _), answers in self.pending.items():
+            if pending_quiz == quiz_id:
+                shifted = {i - (i > index): option for i, option in answers.items() if i != index}
+                answers.clear()
+                answers.update(shifted)
+        async with self._lock:
+            await drafts.drop_answer(quiz_id, index)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self._flush()
+        # Changes recorded during the last flush, or before the loop first ran
+        await self._flush()
+
+    async def _flush(self):
+        async with self._lock:
+            await self._write_pending()
+
+    async def _write_pending(self):
+        pending, self.pending = self.pending, {}
+        discarded, self.discarded = self.discarded, set()
+        self.flushing, self.deleting = pending, discarded
+        autosave_pending.set(0)
+        if not pending and not discarded:
+            return
+        started = asyncio.get_running_loop().time()
+        items = iter(pending.items())
+        try:
+            while batch := dict(islice(items, self.batch_size)):
+                await drafts.upsert_many(batch, datetime.utcnow())
+                autosave_written.inc(len(batch))
+            if discarded:
+                await drafts.delete_many(discarded)
+        except Exception:
+            # Keep unwritten changes for the next flush; newer autosaves win over the retried ones
+            logger.exception("Failed to flush %d autosaved drafts", len(pending))
+            for key, answers in pending.items():
+                self.pending[key] = {**answers, **self.pending.get(key, {})}
+            self.discarded |= discarded - set(self.pending)
+            autosave_pending.set(len(self.pending))
+        finally:
+            self.flushing, self.deleting = {}, set()
+            autosave_flush_seconds.observe(asyncio.get_running_loop().time() - started)
+
+autosave_buffer = DraftBuffer(
+    flush_interval=Config.AUTOSAVE_FLUSH_INTERVAL,
+    max_pending=Config.AUTOSAVE_MAX_PENDING,
+    batch_size=Config.AUTOSAVE_BATCH_SIZE,
+)
@@ -0,0 +1,340 @@
+# Replays the two surges that matter: exam start (student_login, enter_code, take_quiz_page)
+# and the deadline (submit_quiz), with concurrent clients against the app in-process.
+#
+#   python benchmarks/load_test.py --students 500 --clients 100
+#   python benchmarks/load_test.py --spawn-mongod --baseline benchmarks/results/<earlier run>.json
+#
+# Runs against DATABASE_URL, or with --spawn-mongod a throwaway mongod whose data lives on
+# tmpfs, using a database that is dropped afterwards. Requests go straight to the ASGI app
+# (the lifespan runs, so the hash pool and submission writer behave as in production); the
+# numbers are server-side latency without network or HTTP parsing costs.
+# Results are written as JSON so runs can be compared with --baseline.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from auth import get_password_hash
+from main import app, lifespan
+from models import Quiz, QuestionEmbedded, Submission, User
+from config import Config
+from regrade import rebuild_stats
+from repository import quizzes, submissions, users
+
+PASSWORD = "load-test-password"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+class Client:
+    # One student's browser: keeps the session cookie and records latency per route
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.cookies = {}
+
+    async def request(self, route, method, path, form=None):
+        body = urlencode(form, doseq=True).encode() if form else b""
+        headers = [(b"host", b"loadtest")]
+        if self.cookies:
+            headers.append((b"cookie", "; ".join(f"{k}={v}" for k, v in self.cookies.items()).encode()))
+        if form:
+            headers.append((b"content-type", b"application/x-www-form-urlencoded"))
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+            "headers": headers, "client": ("127.0.0.1", 0), "server": ("loadtest", 80),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        response = {"status": None, "headers": [], "size": 0}
+
+        async def receive():
+            return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+
+        started = time.perf_counter()
+        try:
+            await app(scope, receive, send)
+        except Exception as exc:
+            self.recorder.record(route, time.perf_counter() - started, f"exception: {type(exc).__name__}")
+            raise
+        status = response["status"]
+        self.recorder.record(route, time.perf_counter() - started, status if status >= 400 else None, response["size"])
+        for name, value in response["headers"]:
+            if name.lower() == b"set-cookie":
+                for morsel in SimpleCookie(value.decode()).values():
+                    self.cookies[morsel.key] = morsel.value
+        return status, dict((k.lower(), v) for k, v in response["headers"])
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.bytes = {}
+
+    def record(self, route, seconds, error=None, size=0):
+        self.latencies.setdefault(route, []).append(seconds)
+        self.bytes[route] = self.bytes.get(route, 0) + size
+        if error is not None:
+            errors = self.errors.setdefault(route, {})
+            errors[str(error)] = errors.get(str(error), 0) + 1
+
+    def summary(self, elapsed):
+        routes = {}
+        for route, samples in self.latencies.items():
+            samples = sorted(samples)
+            routes[route] = {
+                "requests": len(samples),
+                "errors": self.errors.get(route, {}),
+                "throughput_rps": round(len(samples) / elapsed, 1),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+                "p50_ms": percentile(samples, 0.50),
+                "p95_ms": percentile(samples, 0.95),
+                "p99_ms": percentile(samples, 0.99),
+                "max_ms": round(samples[-1] * 1000, 2),
+                "avg_bytes": round(self.bytes.get(route, 0) / len(samples)),
+            }
+        return routes
+
+def percentile(ordered, q):
+    # Nearest rank on an already sorted list, in milliseconds
+    index = min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))
+    return round(ordered[index] * 1000, 2)
+
+async def seed(args, rng):
+    # One bcrypt hash shared by every seeded student keeps seeding fast; logins still verify it
+    hashed = get_password_hash(PASSWORD)
+    admin = User(email="admin@loadtest.example", name="Admin", hashed_password=hashed, role="admin")
+    await users.insert(admin)
+    exam = None
+    for n in range(args.quizzes):
+        quiz = Quiz(
+            title=f"Load test quiz {n}", duration_minutes=60, code=f"LOAD{n:04d}", creator_email=admin.email,
+            questions=[
+                QuestionEmbedded(text=f"Question {q}", options=["A", "B", "C", "D"], correct_option=rng.randrange(4))
+                for q in range(args.questions)
+            ],
+            modified_at=datetime.utcnow(),
+        )
+        await quizzes.insert(quiz)
+        exam = exam or quiz
+    # Earlier cohorts' submissions, so indexes and stats work at a realistic size
+    for start in range(0, args.history, 1000):
+        stop = min(args.history, start + 1000)
+        await users.collection.insert_many([
+            User(email=f"alumnus{i}@loadtest.example", name=f"Alumnus {i}", school_id=f"A{i}",
+                 hashed_password=hashed, role="student").to_mongo()
+            for i in range(start, stop)
+        ])
+        await submissions.collection.insert_many([
+            Submission(student_email=f"alumnus{i}@loadtest.example", quiz_id=exam.id,
+                       answers=[rng.randrange(4) for _ in range(args.questions)], score=rng.randrange(args.questions + 1),
+                       submitted_at=datetime.utcnow()).to_mongo()
+            for i in range(start, stop)
+        ])
+    if args.history:
+        await rebuild_stats(exam)
+    for start in range(0, args.students, 1000):
+        await users.collection.insert_many([
+            User(email=f"student{i}@loadtest.example", name=f"Student {i}", school_id=f"S{i}",
+                 hashed_password=hashed, role="student").to_mongo()
+            for i in range(start, min(args.students, start + 1000))
+        ])
+    return exam
+
+async def run_clients(count, concurrency, flow):
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def one(i):
+        nonlocal failures
+        async with semaphore:
+            try:
+                await flow(i)
+            except Exception:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return time.perf_counter() - started, failures
+
+async def exam_start(args, quiz, clients):
+    recorder = Recorder()
+
+    async def flow(i):
+        client = clients[i] = Client(recorder)
+        status, _ = await client.request(
+            "student_login", "POST", "/student/login",
+            {"email": f"student{i}@loadtest.example", "password": PASSWORD},
+        )
+        if status != 303:
+            return
+        status, headers = await client.request("enter_code", "POST", "/student/enter_code", {"code": quiz.code})
+        if status != 303:
+            return
+        await client.request("take_quiz_page", "GET", headers[b"location"].decode())
+
+    elapsed, failures = await run_clients(args.students, args.clients, flow)
+    return recorder, elapsed, failures
+
+async def deadline(args, quiz, clients, rng):
+    recorder = Recorder()
+    answers = [{f"q{q + 1}": str(rng.randrange(4)) for q in range(args.questions)} for _ in range(args.students)]
+
+    async def flow(i):
+        client = clients.get(i)
+        if client is None:
+            return
+        client.recorder = recorder
+        await client.request("submit_quiz", "POST", f"/student/submit_quiz/{quiz.id}", answers[i])
+
+    elapsed, failures = await run_clients(args.students, args.clients, flow)
+    return recorder, elapsed, failures
+
+def report(name, routes, elapsed, failures):
+    print(f"\n{name}: {elapsed:.2f} s" + (f", {failures} clients failed" if failures else ""))
+    print(f"  {'route':<16} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, row in routes.items():
+        errors = sum(row["errors"].values())
+        print(f"  {route:<16} {row['requests']:>8} {errors:>6} {row['throughput_rps']:>8} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}")
+
+def compare(result, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nAgainst {baseline_path} ({baseline.get('started_at')}):")
+    for scenario, data in result["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario, {}).get("routes", {})
+        for route, row in data["routes"].items():
+            old = before.get(route)
+            if not old:
+                continue
+            change = lambda key: f"{key} {old[key]} -> {row[key]} ({(row[key] - old[key]) / old[key] * 100 if old[key] else 0:+.0f}%)"
+            print(f"  {scenario}/{route}: {change('p95_ms')}, {change('throughput_rps')}")
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(RESULTS_DIR),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def spawn_mongod():
+    # A standalone mongod on a free port; /dev/shm keeps its data files in memory
+    binary = shutil.which("mongod")
+    if binary is None:
+        raise SystemExit("--spawn-mongod needs a mongod binary on PATH")
+    dbpath = tempfile.mkdtemp(prefix="quiz-load-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen(
+        [binary, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, dbpath, f"mongodb://127.0.0.1:{port}/"
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    shutil.rmtree(dbpath, ignore_errors=True)
+    raise SystemExit("mongod did not start")
+
+async def run(args):
+    rng = random.Random(args.seed)
+    result = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "parameters": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "config": {
+            "SUBMISSION_WRITE_BEHIND": Config.SUBMISSION_WRITE_BEHIND,
+            "HASH_POOL_KIND": Config.HASH_POOL_KIND,
+            "HASH_POOL_WORKERS": Config.HASH_POOL_WORKERS,
+            "HASH_POOL_MAX_QUEUE": Config.HASH_POOL_MAX_QUEUE,
+        },
+        "scenarios": {},
+    }
+    async with lifespan(app):
+        database.db = database.client[args.database]
+        try:
+            await database.ensure_indexes()
+            started = time.perf_counter()
+            quiz = await seed(args, rng)
+            print(f"Seeded {args.students} students, {args.quizzes} quizzes, {args.history} earlier submissions "
+                  f"in {time.perf_counter() - started:.1f} s")
+
+            clients = {}
+            for name, scenario in (
+                ("exam_start", lambda: exam_start(args, quiz, clients)),
+                ("deadline", lambda: deadline(args, quiz, clients, rng)),
+            ):
+                recorder, elapsed, failures = await scenario()
+                routes = recorder.summary(elapsed)
+                result["scenarios"][name] = {"seconds": round(elapsed, 3), "failed_clients": failures, "routes": routes}
+                report(name, routes, elapsed, failures)
+        finally:
+            await database.client.drop_database(args.database)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Exam-start and deadline load test")
+    parser.add_argument("--students", type=int, default=200, help="students taking the exam")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent clients")
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--quizzes", type=int, default=20, help="quizzes owned by the admin")
+    parser.add_argument("--history", type=int, default=5000, help="submissions already stored for the exam")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for answer keys and answers")
+    parser.add_argument("--database", default="quiz_db_load")
+    parser.add_argument("--spawn-mongod", action="store_true", help="run against a throwaway mongod on tmpfs")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load-<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare with")
+    args = parser.parse_args()
+
+    process = dbpath = None
+    if args.spawn_mongod:
+        process, dbpath, url = spawn_mongod()
+        Config.DATABASE_URL = url
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+            shutil.rmtree(dbpath, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{result['started_at'].replace(':', '')[:17]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.baseline:
+        compare(result, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Bytes a student downloads for take_quiz.html: the page with its CSS and JS inline (as it
+# was before the static pipeline) against the page linking fingerprinted, pre-compressed assets.
+#
+#   python manage.py build-static && python benchmarks/page_weight.py --questions 30 200
+#
+# Renders the page in-process (no database needed). Third-party CDN files are not counted.
+import argparse
+import gzip
+import os
+import sys
+import time
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import static_assets
+from config import Config
+from fastapi import Request
+from models import Quiz, QuestionEmbedded
+from quiz_cache import compile_quiz
+from quiz_pages import take_quiz_response
+from templating import templates
+
+ASSETS = {"css/take_quiz.css": ('<link href="{url}" rel="stylesheet" />', "<style>\n{body}</style>"),
+          "js/take_quiz.js": ('<script src="{url}"></script>', "<script>\n{body}</script>")}
+
+def render(questions, accept_encoding):
+    quiz = Quiz(
+        id=ObjectId(), title="Page weight", duration_minutes=60, code="WEIGHT01", version=1,
+        questions=[
+            QuestionEmbedded(text=f"Question {n}: which of these statements about the topic is correct?",
+                             options=[f"Option {o} for question {n}" for o in "ABCD"], correct_option=n % 4)
+            for n in range(questions)
+        ],
+    )
+    request = Request({"type": "http", "method": "GET", "path": "/", "query_string": b"",
+                       "headers": [(b"accept-encoding", accept_encoding.encode())]})
+    return take_quiz_response(templates, request, compile_quiz(quiz)).body
+
+def asset_sizes(name):
+    built = static_assets.manifest.get(name)
+    if built is None:
+        raise SystemExit("No static build found; run `python manage.py build-static` first")
+    path = os.path.join(static_assets.BUILD_DIR, built)
+    sizes = {"identity": os.path.getsize(path)}
+    for encoding, suffix in static_assets.ENCODINGS:
+        if os.path.isfile(path + suffix):
+            sizes[encoding] = os.path.getsize(path + suffix)
+    return sizes
+
+def inline_assets(html):
+    # The page as it was served before: every asset pasted into the HTML
+    for name, (link, inline) in ASSETS.items():
+        with open(os.path.join(static_assets.SOURCE_DIR, name)) as f:
+            body = f.read()
+        tag = link.format(url=static_assets.static_url(name))
+        if tag not in html:
+            raise SystemExit(f"{name} is not linked from take_quiz.html")
+        html = html.replace(tag, inline.format(body=body))
+    return html
+
+def timed_gzip(data, rounds=50):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        compressed = gzip.compress(data, compresslevel=Config.RESPONSE_GZIP_LEVEL)
+    return compressed, (time.perf_counter() - started) / rounds * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="take_quiz.html transfer size before and after the static pipeline")
+    parser.add_argument("--questions", type=int, nargs="+", default=[30, 200])
+    args = parser.parse_args()
+
+    assets = {name: asset_sizes(name) for name in ASSETS}
+    best = lambda sizes: min(sizes.values())
+    print("Assets (identity / gzip / br bytes):")
+    for name, sizes in assets.items():
+        print(f"  {name:<20} " + " / ".join(str(sizes.get(e, "-")) for e in ("identity", "gzip", "br")))
+
+    for questions in args.questions:
+        html = render(questions, "identity")
+        linked_gzip = render(questions, "gzip")
+        before = inline_assets(html.decode()).encode()
+        before_gzip, gzip_ms = timed_gzip(before)
+        first = len(linked_gzip) + sum(best(sizes) for sizes in assets.values())
+        print(f"\n{questions} questions{' (first page inline, rest lazy-loaded)' if questions > Config.LAZY_QUIZ_THRESHOLD else ''}:")
+        print(f"  inline assets, uncompressed     {len(before):>8} bytes every visit")
+        print(f"  inline assets, gzip             {len(before_gzip):>8} bytes every visit ({gzip_ms:.2f} ms to compress)")
+        print(f"  linked assets, first visit      {first:>8} bytes (page gzip {len(linked_gzip)} + assets)")
+        print(f"  linked assets, repeat visit     {len(linked_gzip):>8} bytes (assets cached as immutable)")
+        print(f"  repeat visit vs uncompressed    {(1 - len(linked_gzip) / len(before)) * 100:>7.1f}% smaller")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Compares per-request submission inserts with the write-behind SubmissionWriter.
+#
+#   python benchmarks/submission_writes.py --submissions 2000 --concurrency 400
+#
+# Runs against DATABASE_URL using a throwaway database that is dropped afterwards.
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from models import Submission
+from repository import submissions
+from write_behind import SubmissionWriter
+
+def make_submissions(count, questions):
+    quiz_id = ObjectId()
+    return [
+        Submission(
+            student_email=f"student{i}@example.com",
+            quiz_id=quiz_id,
+            answers=[i % 4] * questions,
+            score=questions // 4,
+            submitted_at=datetime.utcnow(),
+        )
+        for i in range(count)
+    ]
+
+async def run_concurrently(save, batch, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(submission):
+        async with semaphore:
+            started = time.perf_counter()
+            await save(submission)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(s) for s in batch))
+    return time.perf_counter() - started, sorted(latencies)
+
+def report(name, elapsed, latencies):
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"{name:<14} {len(latencies) / elapsed:9.0f} writes/s   p50 {p(0.50):7.1f} ms   p99 {p(0.99):7.1f} ms")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-request vs write-behind submission inserts")
+    parser.add_argument("--submissions", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=400)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-delay", type=float, default=0.05)
+    parser.add_argument("--database", default="quiz_db_bench")
+    args = parser.parse_args()
+
+    await database.connect_db(build_indexes=False)
+    database.db = database.client[args.database]
+    try:
+        await database.ensure_indexes()
+
+        batch = make_submissions(args.submissions, args.questions)
+        elapsed, latencies = await run_concurrently(submissions.insert_once, batch, args.concurrency)
+        report("per-request", elapsed, latencies)
+
+        writer = SubmissionWriter(batch_size=args.batch_size, max_delay=args.max_delay, max_queue=args.submissions)
+        writer.start()
+        batch = make_submissions(args.submissions, args.questions)
+        elapsed, latencies = await run_concurrently(writer.save, batch, args.concurrency)
+        await writer.stop()
+        report("write-behind", elapsed, latencies)
+    finally:
+        await database.client.drop_database(args.database)
+        await database.close_db()
+
+if __name__ == "__main__":
+    asyncio.run(main())
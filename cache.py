@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from metrics import Counter, Gauge
+
+cache_hits = Counter("cache_hits_total", "Cache lookups that found a live entry", ["cache"])
+cache_misses = Counter("cache_misses_total", "Cache lookups that found nothing or an expired entry", ["cache"])
+cache_size = Gauge("cache_entries", "Entries currently held by a cache", ["cache"])
+
+_MISSING = object()
+
+# LRU cache whose entries also expire after ttl seconds (ttl=None keeps them until evicted).
+# maxsize counts entries, or whatever weigher(value) measures (e.g. bytes) when one is given.
+class TTLCache:
+    def __init__(self, name, maxsize=1024, ttl=None, weigher=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigher = weigher or (lambda value: 1)
+        self.weight = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires, weight = entry
+                if expires is None or expires > now:
+                    self._data.move_to_end(key)
+                    cache_hits.inc(cache=self.name)
+                    return value
+                del self._data[key]
+                self.weight -= weight
+                cache_size.set(len(self._data), cache=self.name)
+        cache_misses.inc(cache=self.name)
+        return default
+
+    def set(self, key, value, ttl=None):
+        weight = self.weigher(value)
+        if self.maxsize <= 0 or weight > self.maxsize:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl or ttl)
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.weight -= previous[2]
+            self._data[key] = (value, expires, weight)
+            self.weight += weight
+            while self.weight > self.maxsize:
+                _, evicted = self._data.popitem(last=False)
+                self.weight -= evicted[2]
+            cache_size.set(len(self._data), cache=self.name)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self.weight -= entry[2]
+            cache_size.set(len(self._data), cache=self.name)
+        return entry[0] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+            cache_size.set(0, cache=self.name)
+
+    def __len__(self):
+        return len(self._data)
@@ -1,10 +1,63 @@
 import os
 from dotenv import load_dotenv
 
+# The only place .env is read; everything else takes its settings from Config
 load_dotenv()
 
 class Config:
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    DATABASE_NAME = os.getenv("DATABASE_NAME", "quiz_db")
+    # Per worker process: the client is created in the lifespan, after uvicorn forks
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000))
+    MONGO_WARMUP_CONNECTIONS = int(os.getenv("MONGO_WARMUP_CONNECTIONS", 4))
+    READINESS_TIMEOUT = float(os.getenv("READINESS_TIMEOUT", 2.0))
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+    RESPONSE_GZIP_MIN_SIZE = int(os.getenv("RESPONSE_GZIP_MIN_SIZE", 1024))
+    RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", 6))
     ADMIN_SECRET = str(os.getenv("ADMIN_SECRET"))
     SECRET_KEY = str(os.getenv("SECRET_KEY"))
     ALGORITHM = str(os.getenv("ALGORITHM"))
-    ACCESS_TOKEN_EXPIRE_HOURS = int(os.getenv("ACCESS_TOKEN_EXPIRE_HOURS", 24))
\ No newline at end of file
+    ACCESS_TOKEN_EXPIRE_HOURS = int(os.getenv("ACCESS_TOKEN_EXPIRE_HOURS", 24))
+    HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", "thread")
+    HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", os.cpu_count() or 1))
+    HASH_POOL_MAX_QUEUE = int(os.getenv("HASH_POOL_MAX_QUEUE", 64))
+    HASH_POOL_RETRY_AFTER = int(os.getenv("HASH_POOL_RETRY_AFTER", 5))
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+    QUIZ_CACHE_SIZE = int(os.getenv("QUIZ_CACHE_SIZE", 256))
+    BUILD_INDEXES_ON_STARTUP = os.getenv("BUILD_INDEXES_ON_STARTUP", "true").lower() == "true"
+    SUBMISSION_WRITE_BEHIND = os.getenv("SUBMISSION_WRITE_BEHIND", "false").lower() == "true"
+    SUBMISSION_BATCH_SIZE = int(os.getenv("SUBMISSION_BATCH_SIZE", 500))
+    SUBMISSION_MAX_ACK_DELAY = float(os.getenv("SUBMISSION_MAX_ACK_DELAY", 0.05))
+    SUBMISSION_QUEUE_SIZE = int(os.getenv("SUBMISSION_QUEUE_SIZE", 5000))
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 500))
+    REGRADE_ON_EDIT = os.getenv("REGRADE_ON_EDIT", "true").lower() == "true"
+    REGRADE_BATCH_SIZE = int(os.getenv("REGRADE_BATCH_SIZE", 5000))
+    ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", 64))
+    IMPORT_MAX_QUESTIONS = int(os.getenv("IMPORT_MAX_QUESTIONS", 2000))
+    QUIZ_HTML_CACHE_BYTES = int(os.getenv("QUIZ_HTML_CACHE_BYTES", 64 * 1024 * 1024))
+    QUIZ_HTML_GZIP = os.getenv("QUIZ_HTML_GZIP", "true").lower() == "true"
+    QUESTION_PAGE_SIZE = int(os.getenv("QUESTION_PAGE_SIZE", 20))
+    QUESTION_PAGE_MAX = int(os.getenv("QUESTION_PAGE_MAX", 100))
+    LAZY_QUIZ_THRESHOLD = int(os.getenv("LAZY_QUIZ_THRESHOLD", 50))
+    AUTOSAVE_INTERVAL = int(os.getenv("AUTOSAVE_INTERVAL", 10))
+    AUTOSAVE_FLUSH_INTERVAL = float(os.getenv("AUTOSAVE_FLUSH_INTERVAL", 2.0))
+    AUTOSAVE_MAX_PENDING = int(os.getenv("AUTOSAVE_MAX_PENDING", 5000))
+    AUTOSAVE_BATCH_SIZE = int(os.getenv("AUTOSAVE_BATCH_SIZE", 1000))
+    LIVE_FEED_SOURCE = os.getenv("LIVE_FEED_SOURCE", "local")
+    LIVE_FEED_QUEUE_SIZE = int(os.getenv("LIVE_FEED_QUEUE_SIZE", 100))
+    LIVE_FEED_HEARTBEAT = float(os.getenv("LIVE_FEED_HEARTBEAT", 15))
+    LIVE_FEED_RETRY_SECONDS = float(os.getenv("LIVE_FEED_RETRY_SECONDS", 5))
+    ROSTER_HASH_WORKERS = int(os.getenv("ROSTER_HASH_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+    ROSTER_BATCH_SIZE = int(os.getenv("ROSTER_BATCH_SIZE", 250))
+    ROSTER_MAX_ROWS = int(os.getenv("ROSTER_MAX_ROWS", 20000))
+    ROSTER_JOBS_KEPT = int(os.getenv("ROSTER_JOBS_KEPT", 20))
+    SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 0.5))
+    QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off")
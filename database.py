@@ -1,11 +1,65 @@
-from mongoengine import connect
-import os
-from dotenv import load_dotenv
+import asyncio
+from pymongo import AsyncMongoClient
+from models import User, Quiz, Submission, Draft
+from config import Config
+from instrumentation import command_metrics
 
-load_dotenv()
+client = None
+db = None
 
-def connect_db():
-    connect(
-        db="quiz_db",
-        host=os.getenv("DATABASE_URL")
-    )
\ No newline at end of file
+def _client_options():
+    return dict(
+        maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+        minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=Config.MONGO_MAX_IDLE_TIME_MS,
+        connectTimeoutMS=Config.MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=Config.MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[command_metrics],
+    )
+
+async def connect_db(build_indexes=Config.BUILD_INDEXES_ON_STARTUP, warm_up=Config.MONGO_WARMUP_CONNECTIONS):
+    # Called from the lifespan (after fork), never at import time
+    global client, db
+    client = AsyncMongoClient(Config.DATABASE_URL, **_client_options())
+    db = client.get_default_database(Config.DATABASE_NAME)
+    if warm_up:
+        await warm_up_pool(warm_up)
+    if build_indexes:
+        await ensure_indexes()
+
+async def warm_up_pool(connections):
+    # Concurrent pings open that many pooled connections before the first request needs one;
+    # an unreachable server fails startup after serverSelectionTimeoutMS instead of a request
+    await asyncio.gather(*(db.command("ping") for _ in range(min(connections, Config.MONGO_MAX_POOL_SIZE))))
+
+async def ping(timeout=Config.READINESS_TIMEOUT):
+    if db is None:
+        return False
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout)
+        return True
+    except Exception:
+        return False
+
+async def close_db():
+    global client, db
+    if client is not None:
+        await client.close()
+    client = None
+    db = None
+
+def get_db():
+    if db is None:
+        raise RuntimeError("Database is not connected")
+    return db
+
+async def ensure_indexes():
+    # Indexes are declared in each model's meta; create_index is a no-op for existing ones
+    for model in (User, Quiz, Submission, Draft):
+        collection = db[model._get_collection_name()]
+        for spec in model._meta["index_specs"]:
+            spec = dict(spec)
+            fields = spec.pop("fields")
+            await collection.create_index(fields, **spec)
@@ -0,0 +1,78 @@
+import hashlib
+import os
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request
+from fastapi.responses import Response
+from static_assets import MANIFEST
+
+# Responses keyed by a version counter are revalidated on every use; a match costs no rendering
+REVALIDATE = "private, no-cache"
+
+def _template_tag(directory="templates"):
+    # Page validators change with a deploy that edits templates or rebuilds the
+    # fingerprinted assets pages link to, not only with the data
+    digest = hashlib.blake2b(digest_size=6)
+    paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))] + [MANIFEST]
+    for path in paths:
+        if os.path.isfile(path):
+            digest.update(path.encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+TEMPLATE_TAG = _template_tag()
+
+def make_etag(*parts):
+    # Weak: responses over RESPONSE_GZIP_MIN_SIZE are gzipped on the fly when accepted
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+def page_etag(*parts):
+    # Weak: the same page may be sent gzip-encoded or not
+    digest = hashlib.blake2b(repr((TEMPLATE_TAG,) + parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+def _opaque(tag):
+    return tag.strip().removeprefix("W/")
+
+def etag_matches(request: Request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in [_opaque(tag) for tag in header.split(",")]
+
+def not_modified(etag, cache_control=REVALIDATE, last_modified=None):
+    return Response(status_code=304, headers=validator_headers(etag, last_modified, cache_control))
+
+def validator_headers(etag, last_modified=None, cache_control=REVALIDATE):
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+def is_not_modified(request: Request, etag, last_modified=None):
+    # If-None-Match wins; If-Modified-Since is only consulted without it (RFC 9110 13.2.2)
+    if "if-none-match" in request.headers:
+        return etag_matches(request, etag)
+    since = request.headers.get("if-modified-since")
+    if last_modified is None or not since:
+        return False
+    try:
+        since = parsedate_to_datetime(since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+def conditional_response(request: Request, etag, last_modified=None):
+    # A 304 to return as-is, or None when the page has to be rendered
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified=last_modified)
+    return None
+
+def add_validators(response, etag, last_modified=None):
+    response.headers.update(validator_headers(etag, last_modified))
+    return response
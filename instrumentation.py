@@ -0,0 +1,135 @@
+import asyncio
+import contextvars
+import logging
+import time
+from pymongo import monitoring
+from config import Config
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+http_request_seconds = Histogram("http_request_duration_seconds", "Request latency by route", ["method", "route"])
+http_requests = Counter("http_requests_total", "Requests by route and status code", ["method", "route", "status"])
+http_in_flight = Gauge("http_requests_in_flight", "Requests currently being handled", ["method"])
+request_db_commands = Histogram(
+    "http_request_db_commands", "Database commands issued per request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+request_db_seconds = Histogram("http_request_db_seconds", "Time per request spent in database commands", ["route"])
+mongo_command_seconds = Histogram("mongo_command_duration_seconds", "Database command latency", ["command"])
+mongo_commands = Counter("mongo_commands_total", "Database commands by outcome", ["command", "outcome"])
+
+# Database commands of the request being handled; background tasks see None or a closed record.
+# A nested record (e.g. a query budget) also counts toward the one it was opened inside.
+class RequestStats:
+    __slots__ = ("commands", "closed", "parent")
+
+    def __init__(self, parent=None):
+        self.commands = {}
+        self.closed = False
+        self.parent = parent
+
+    def add(self, command, seconds):
+        if self.closed:
+            return
+        entry = self.commands.get(command)
+        if entry is None:
+            self.commands[command] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+        if self.parent is not None:
+            self.parent.add(command, seconds)
+
+    @property
+    def count(self):
+        return sum(n for n, _ in self.commands.values())
+
+    @property
+    def seconds(self):
+        return sum(s for _, s in self.commands.values())
+
+    def breakdown(self):
+        ordered = sorted(self.commands.items(), key=lambda item: item[1][1], reverse=True)
+        return ", ".join(f"{name} x{n} {s * 1000:.1f} ms" for name, (n, s) in ordered)
+
+current_stats = contextvars.ContextVar("request_db_stats", default=None)
+
+def background_task(coro):
+    # Jobs started by a request (regrades, roster imports) are not billed to that request
+    context = contextvars.copy_context()
+    context.run(current_stats.set, None)
+    return asyncio.create_task(coro, context=context)
+
+class CommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, "succeeded")
+
+    def failed(self, event):
+        self._record(event, "failed")
+
+    def _record(self, event, outcome):
+        seconds = event.duration_micros / 1_000_000
+        mongo_command_seconds.observe(seconds, command=event.command_name)
+        mongo_commands.inc(command=event.command_name, outcome=outcome)
+        stats = current_stats.get()
+        if stats is not None:
+            stats.add(event.command_name, seconds)
+
+command_metrics = CommandMetrics()
+
+def route_label(scope):
+    # The route template keeps the label set small ("/admin/quiz_details/{quiz_id}", not every id)
+    route = scope.get("route")
+    if getattr(route, "path", None):
+        return route.path
+    # Mounted apps (/static) have no route; label them by the prefix the mount matched
+    if "app_root_path" in scope:
+        return scope.get("root_path", "")[len(scope["app_root_path"]):] or "unmatched"
+    return "unmatched"
+
+# Plain ASGI middleware: no extra task per request, and the streamed body is included in the latency
+class InstrumentationMiddleware:
+    def __init__(self, app, slow_seconds=None):
+        self.app = app
+        self.slow_seconds = Config.SLOW_REQUEST_SECONDS if slow_seconds is None else slow_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        stats = RequestStats(parent=current_stats.get())
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        http_in_flight.inc(method=method)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.closed = True
+            current_stats.reset(token)
+            http_in_flight.dec(method=method)
+            route = route_label(scope)
+            http_request_seconds.observe(elapsed, method=method, route=route)
+            http_requests.inc(method=method, route=route, status=status)
+            request_db_commands.observe(stats.count, route=route)
+            request_db_seconds.observe(stats.seconds, route=route)
+            if elapsed >= self.slow_seconds:
+                logger.warning(
+                    "Slow request %s %s -> %s in %.1f ms; %d db commands in %.1f ms (%s)",
+                    method, route, status, elapsed * 1000, stats.count, stats.seconds * 1000,
+                    stats.breakdown() or "none",
+                )
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+from config import Config
+from metrics import Counter, Gauge
+from quiz_cache import get_compiled_quiz
+from repository import points_for, quiz_stats, submissions, users
+
+logger = logging.getLogger(__name__)
+
+live_watchers = Gauge("live_feed_watchers", "Open live feed connections")
+live_events = Counter("live_feed_events_total", "Submission events published to the live feed")
+live_dropped = Counter("live_feed_dropped_total", "Events dropped for watchers that fell behind")
+
+# In-process pub/sub for quiz_details watchers. Running aggregates are seeded from
+# quiz_stats (or, like quiz_details, the submissions when there are none) when the first
+# watcher of a quiz connects and then kept up to date from the published events, so any
+# number of watchers costs no further database reads.
+class LiveFeed:
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self.watchers = {}
+        self.aggregates = {}
+
+    def has_watchers(self, quiz_id):
+        return bool(self.watchers.get(quiz_id))
+
+    async def _seed(self, quiz):
+        stats = (await quiz_stats.for_quizzes([quiz.id])).get(quiz.id)
+        if stats is not None and stats.count:
+            return {"count": stats.count, "score_sum": stats.score_sum, "points_sum": stats.points_sum}
+        # Quizzes with submissions from before statistics were tracked
+        return await submissions.totals(quiz.id, len(quiz.questions), quiz.total_points)
+
+    async def subscribe(self, quiz):
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        if quiz.id not in self.aggregates:
+            aggregate = await self._seed(quiz)
+            self.aggregates.setdefault(quiz.id, aggregate)
+        self.watchers.setdefault(quiz.id, set()).add(queue)
+        live_watchers.inc()
+        return queue
+
+    async def reseed(self, quiz):
+        # The statistics were recomputed (regrade, rebuild-stats): the running totals start over from them
+        if self.has_watchers(quiz.id):
+            self.aggregates[quiz.id] = await self._seed(quiz)
+        else:
+            self.aggregates.pop(quiz.id, None)
+
+    def unsubscribe(self, quiz_id, queue):
+        watchers = self.watchers.get(quiz_id)
+        if watchers is None or queue not in watchers:
+            return
+        watchers.discard(queue)
+        live_watchers.dec()
+        if not watchers:
+            del self.watchers[quiz_id]
+            self.aggregates.pop(quiz_id, None)
+
+    def snapshot(self, quiz_id):
+        aggregate = self.aggregates.get(quiz_id, {"count": 0, "score_sum": 0, "points_sum": 0})
+        count = aggregate["count"]
+        return {
+            "total_students": count,
+            "avg_correct": round(aggregate["score_sum"] / count, 1) if count else 0,
+            "avg_points": round(aggregate["points_sum"] / count, 1) if count else 0,
+        }
+
+    def publish(self, quiz, submission, student_name, school_id=None):
+        # quiz is a CompiledQuiz; a no-op unless someone is watching
+        watchers = self.watchers.get(quiz.id)
+        if not watchers:
+            return
+        total_questions = len(quiz.questions)
+        points = points_for(submission.score, total_questions, quiz.total_points)
+        aggregate = self.aggregates[quiz.id]
+        aggregate["count"] += 1
+        aggregate["score_sum"] += submission.score
+        aggregate["points_sum"] += points
+        event = {
+            "name": student_name or "Unknown",
+            "school_id": school_id or "N/A",
+            "email": submission.student_email,
+            "correct_count": submission.score,
+            "total_questions": total_questions,
+            "points_earned": points,
+            "total_points": quiz.total_points,
+            "submitted_at": submission.submitted_at.strftime('%Y-%m-%d %H:%M'),
+            **self.snapshot(quiz.id),
+        }
+        live_events.inc()
+        message = format_event("submission", event)
+        for queue in watchers:
+            if queue.full():
+                # A slow watcher loses its oldest event; every event carries the current totals
+                queue.get_nowait()
+                live_dropped.inc()
+            queue.put_nowait(message)
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+live_feed = LiveFeed(max_queue=Config.LIVE_FEED_QUEUE_SIZE)
+
+# Multi-worker deployments: every worker follows submission inserts through a change
+# stream (replica set required) instead of relying on the worker that took the submit.
+class ChangeStreamSource:
+    def __init__(self, feed):
+        self.feed = feed
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with await submissions.collection.watch(pipeline) as stream:
+                    async for change in stream:
+                        submission = submissions._load(change["fullDocument"])
+                        if not self.feed.has_watchers(submission.quiz_id):
+                            continue
+                        quiz = await get_compiled_quiz(submission.quiz_id)
+                        if quiz is None:
+                            continue
+                        profiles = await users.profiles_by_email([submission.student_email])
+                        profile = profiles.get(submission.student_email) or {}
+                        self.feed.publish(quiz, submission, profile.get("name"), profile.get("school_id"))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Live feed change stream failed, reconnecting")
+                await asyncio.sleep(Config.LIVE_FEED_RETRY_SECONDS)
+
+change_stream_source = ChangeStreamSource(live_feed)
@@ -1,26 +1,57 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from starlette.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from routers import admin, student
-from database import connect_db
+from database import connect_db, close_db, ping
+from auth import hash_pool
+from roster import roster_pool
+from config import Config
+from templating import templates
+from static_assets import StaticAssets
+from write_behind import submission_writer
+from autosave import autosave_buffer
+from live import change_stream_source
+import metrics
+from instrumentation import InstrumentationMiddleware
+from query_budget import QueryBudgetMiddleware
+from contextlib import asynccontextmanager
 import uvicorn
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_db()
+    hash_pool.start()
+    if Config.SUBMISSION_WRITE_BEHIND:
+        submission_writer.start()
+    autosave_buffer.start()
+    if Config.LIVE_FEED_SOURCE == "changestream":
+        change_stream_source.start()
+    yield
+    await change_stream_source.stop()
+    await autosave_buffer.stop()
+    await submission_writer.stop()
+    hash_pool.shutdown()
+    roster_pool.shutdown()
+    await close_db()
 
-app.mount("/static", StaticFiles(directory="templates"), name="static")
-templates = Jinja2Templates(directory="templates")
+app = FastAPI(lifespan=lifespan)
+# Innermost, so request latency includes compression; responses that already carry a
+# Content-Encoding (pre-compressed quiz pages and assets) and event streams pass through
+app.add_middleware(GZipMiddleware, minimum_size=Config.RESPONSE_GZIP_MIN_SIZE, compresslevel=Config.RESPONSE_GZIP_LEVEL)
+# Staging only: "log" or "raise" checks each route against its database command budget
+if Config.QUERY_BUDGET_MODE != "off":
+    app.add_middleware(QueryBudgetMiddleware, mode=Config.QUERY_BUDGET_MODE)
+app.add_middleware(InstrumentationMiddleware)
+
+app.mount("/static", StaticAssets(directory="static"), name="static")
 
 app.include_router(admin.router, prefix="/admin", tags=["admin"])
 app.include_router(student.router, prefix="/student", tags=["student"])
 
-# Connect to DB
-connect_db()
-
 # Custom error handler
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return templates.TemplateResponse("error.html", {"request": request, "detail": exc.detail}, status_code=exc.status_code)
+    return templates.TemplateResponse("error.html", {"request": request, "detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
@@ -40,5 +71,17 @@ async def get_started(request: Request):
 async def api_status():
     return {"status": "online", "app": "QuizMaster", "version": "1.0.0"}
 
+# Readiness for load balancers and orchestrators; /api/status stays a liveness check without I/O
+@app.get("/api/ready")
+async def api_ready():
+    if not await ping():
+        return JSONResponse({"status": "unavailable", "database": "unreachable"}, status_code=503)
+    return {"status": "ready", "database": "ok"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return metrics.render()
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Each worker imports the app and opens its own database pool in the lifespan
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=Config.WEB_CONCURRENCY)
\ No newline at end of file
@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from urllib.parse import urlencode
+from bson import ObjectId
+import database
+from config import Config
+from models import User, Quiz, QuestionEmbedded, Submission
+from query_budget import ROUTE_BUDGETS, query_budget
+from repository import quizzes, submissions, users
+import regrade
+import roster
+import static_assets
+
+# One representative query per access pattern the routes issue: (route, model, filter, sort)
+QUERY_PATTERNS = [
+    ("get_current_user", User, {"email": "student@example.com"}, None),
+    ("admin_login / student_login", User, {"email": "admin@example.com", "role": "admin"}, None),
+    ("admin_dashboard", Quiz, {"creator_email": "admin@example.com"}, [("_id", -1)]),
+    ("enter_code", Quiz, {"code": "ABCD1234"}, None),
+    ("take_quiz_page / submit_quiz", Quiz, {"_id": ObjectId()}, None),
+    ("enter_code / take_quiz_page / submit_quiz", Submission, {"quiz_id": ObjectId(), "student_email": "student@example.com"}, None),
+    ("quiz_details", Submission, {"quiz_id": ObjectId()}, [("submitted_at", -1), ("_id", -1)]),
+]
+
+def _plan_stages(plan):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+async def dedupe_submissions(args):
+    # The unique (quiz_id, student_email) index cannot be built while duplicates exist; keep the earliest
+    collection = database.get_db()[Submission._get_collection_name()]
+    pipeline = [
+        {"$sort": {"submitted_at": 1, "_id": 1}},
+        {"$group": {"_id": {"quiz_id": "$quiz_id", "student_email": "$student_email"}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    removed = 0
+    async for group in await collection.aggregate(pipeline, allowDiskUse=True):
+        result = await collection.delete_many({"_id": {"$in": group["ids"][1:]}})
+        removed += result.deleted_count
+    print(f"Removed {removed} duplicate submissions")
+    return 0
+
+async def rebuild_stats(args):
+    # Needed after questions or answer keys change, or if a stats update was lost
+    targets = [await quizzes.get(id=args.quiz)] if args.quiz else await quizzes.find()
+    for quiz in targets:
+        if quiz is None:
+            print(f"Quiz {args.quiz} not found")
+            return 1
+        stats = await regrade.rebuild_stats(quiz, batch_size=Config.REGRADE_BATCH_SIZE)
+        print(f"{quiz.code}: {stats.count} submissions")
+    return 0
+
+async def build_indexes(args):
+    await database.ensure_indexes()
+    print("Indexes built")
+    return 0
+
+async def check_indexes(args):
+    db = database.get_db()
+    failures = 0
+    for route, model, query, sort in QUERY_PATTERNS:
+        cursor = db[model._get_collection_name()].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = set(_plan_stages(explain["queryPlanner"]["winningPlan"]))
+        ok = "COLLSCAN" not in stages and "SORT" not in stages
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {route}: {model.__name__} {sorted(s for s in stages if s)}")
+    return 1 if failures else 0
+
+async def import_roster(args):
+    if not args.file:
+        print("import-roster needs --file")
+        return 1
+    with open(args.file, "rb") as binary:
+        rows, errors = roster.parse_roster(binary)
+    job = roster.start_import("manage.py", args.file, rows, errors)
+    try:
+        while not job.task.done():
+            await asyncio.wait([job.task], timeout=2)
+            print(f"{job.done} / {job.total} rows, {job.created} created, {job.skipped} skipped", flush=True)
+    finally:
+        roster.roster_pool.shutdown()
+    for line, email, message in sorted(job.errors):
+        print(f"line {line}: {email} {message}".rstrip())
+    if job.credentials:
+        with open(args.credentials, "w", newline="") as out:
+            out.write(roster.credentials_csv(job))
+        print(f"Generated passwords written to {args.credentials}")
+    if job.status == "failed":
+        print(f"Import failed: {job.error}")
+        return 1
+    return 0
+
+# Routes whose command count must not grow with the number of submissions: (label, method, path, as, form)
+BUDGET_CHECKS = [
+    ("admin_dashboard", "GET", "/admin/dashboard", "admin", None),
+    ("quiz_details", "GET", "/admin/quiz_details/{quiz_id}", "admin", None),
+    ("enter_code", "POST", "/student/enter_code", "student", {"code": "{code}"}),
+    ("take_quiz_page", "GET", "/student/take_quiz/{quiz_id}", "student", None),
+    ("quiz_questions", "GET", "/student/quiz/{quiz_id}/questions", "student", None),
+    ("submit_quiz", "POST", "/student/submit_quiz/{quiz_id}", "student", {"q1": "0", "q2": "1"}),
+]
+
+async def _call_app(app, method, path, token, form=None):
+    # In-process ASGI request; the lifespan is not run, so writes go straight to the database
+    body = urlencode(form).encode() if form else b""
+    headers = [(b"cookie", f"access_token={token}".encode())]
+    if form:
+        headers.append((b"content-type", b"application/x-www-form-urlencoded"))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": headers, "client": ("127.0.0.1", 0), "server": ("testserver", 80), "app": app,
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = None
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+def _clear_caches():
+    import auth, quiz_cache, quiz_pages
+    for cache in (auth.token_cache, auth.user_cache, quiz_cache.compiled_quizzes, quiz_cache.quiz_ids_by_code, quiz_pages.fragments):
+        cache.clear()
+
+async def _seed_submissions(quiz, start, stop):
+    students = [
+        User(email=f"student{i}@example.com", name=f"Student {i}", school_id=f"S{i}", hashed_password="-", role="student")
+        for i in range(start, stop)
+    ]
+    await users.collection.insert_many([student.to_mongo() for student in students])
+    await submissions.collection.insert_many([
+        Submission(student_email=student.email, quiz_id=quiz.id, answers=[i % 4] * len(quiz.questions),
+                   score=i % len(quiz.questions), submitted_at=datetime.utcnow()).to_mongo()
+        for i, student in enumerate(students, start)
+    ])
+    await regrade.rebuild_stats(quiz)
+
+async def check_query_budgets(args):
+    # Seeds a throwaway database with 10 and then 1,000 submissions and runs each route in
+    # BUDGET_CHECKS with cold caches: the counts must be equal and within ROUTE_BUDGETS.
+    from auth import create_access_token
+    from main import app
+
+    database.db = database.client[args.database]
+    try:
+        await database.ensure_indexes()
+        admin = User(email="admin@example.com", name="Admin", hashed_password="-", role="admin")
+        await users.insert(admin)
+        quiz = Quiz(
+            title="Budget check", duration_minutes=30, code="BUDGET01", creator_email=admin.email,
+            questions=[QuestionEmbedded(text=f"Q{n}", options=["a", "b", "c", "d"], correct_option=n % 4) for n in range(10)],
+            modified_at=datetime.utcnow(),
+        )
+        await quizzes.insert(quiz)
+        tokens = {"admin": create_access_token(admin.email)}
+        counts, failures = {}, 0
+        seeded = 0
+        for size in (10, 1000):
+            await _seed_submissions(quiz, seeded, size)
+            seeded = size
+            # A student with no submission yet, so enter_code, take_quiz and submit take the full path
+            pending = User(email=f"pending{size}@example.com", name="Pending", hashed_password="-", role="student")
+            await users.insert(pending)
+            tokens["student"] = create_access_token(pending.email)
+            for label, method, path, role, form in BUDGET_CHECKS:
+                path = path.format(quiz_id=quiz.id)
+                form = {key: value.format(code=quiz.code) for key, value in form.items()} if form else None
+                _clear_caches()
+                with query_budget(None) as budget:
+                    status = await _call_app(app, method, path, tokens[role], form)
+                counts.setdefault(label, []).append(budget.count)
+                print(f"{label:<16} {size:>5} submissions: {budget.count} commands (HTTP {status})")
+                if status >= 400:
+                    failures += 1
+        for label, method, path, role, form in BUDGET_CHECKS:
+            limit = ROUTE_BUDGETS.get((method, path))
+            seen = counts[label]
+            ok = len(set(seen)) == 1 and (limit is None or max(seen) <= limit)
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {label}: {' / '.join(map(str, seen))} commands, budget {limit}")
+    finally:
+        await database.client.drop_database(args.database)
+    return 1 if failures else 0
+
+async def build_static(args):
+    manifest, sizes = static_assets.build()
+    for name, built in sorted(manifest.items()):
+        encoded = ", ".join(f"{encoding} {size}" for encoding, size in sizes[name].items())
+        print(f"{name} -> build/{built} ({encoded} bytes)")
+    if static_assets.brotli is None:
+        print("brotli is not installed; only gzip copies were built")
+    return 0
+
+COMMANDS = {
+    "build-indexes": build_indexes,
+    "build-static": build_static,
+    "check-indexes": check_indexes,
+    "check-query-budgets": check_query_budgets,
+    "dedupe-submissions": dedupe_submissions,
+    "import-roster": import_roster,
+    "rebuild-stats": rebuild_stats,
+}
+
+# Commands that do not need the database
+OFFLINE_COMMANDS = {"build-static"}
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="QuizMaster management commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--quiz", help="limit rebuild-stats to one quiz id")
+    parser.add_argument("--file", help="roster CSV for import-roster")
+    parser.add_argument("--credentials", default="credentials.csv", help="where import-roster writes generated passwords")
+    parser.add_argument("--database", default="quiz_db_budget", help="throwaway database for check-query-budgets, dropped afterwards")
+    args = parser.parse_args(argv)
+    if args.command in OFFLINE_COMMANDS:
+        return await COMMANDS[args.command](args)
+    await database.connect_db(build_indexes=False)
+    try:
+        return await COMMANDS[args.command](args)
+    finally:
+        await database.close_db()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
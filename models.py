@@ -22,6 +22,16 @@ class Quiz(Document):
     code = fields.StringField(unique=True)
     creator_email = fields.EmailField()
     total_points = fields.IntField(min_value=1, default=100)
+    version = fields.IntField(default=0)
+    # Last question edit, sent as Last-Modified with pages built from the questions only
+    modified_at = fields.DateTimeField()
+
+    meta = {
+        "indexes": [
+            # admin_dashboard: creator's quizzes, newest first
+            {"fields": ["creator_email", "-id"]},
+        ]
+    }
 
 class Submission(Document):
     student_email = fields.EmailField()
@@ -29,6 +39,46 @@ class Submission(Document):
     answers = fields.ListField(fields.IntField())
     score = fields.IntField()
     submitted_at = fields.DateTimeField()
+    # Quiz version the answers were given against; a question delete only shifts older ones
+    quiz_version = fields.IntField()
+
+    meta = {
+        "indexes": [
+            # One submission per student per quiz; also serves the enter_code check
+            {"fields": ["quiz_id", "student_email"], "unique": True},
+            # quiz_details: a quiz's submissions, newest first
+            {"fields": ["quiz_id", "-submitted_at", "-id"]},
+        ]
+    }
+
+class Draft(Document):
+    quiz_id = fields.ObjectIdField()
+    student_email = fields.EmailField()
+    # question index -> chosen option (keys are strings), merged by autosave upserts
+    answers = fields.DictField()
+    updated_at = fields.DateTimeField()
+
+    meta = {
+        "collection": "drafts",
+        "indexes": [
+            {"fields": ["quiz_id", "student_email"], "unique": True},
+            # Drafts of abandoned attempts are dropped by MongoDB after a week
+            {"fields": ["updated_at"], "expireAfterSeconds": 7 * 24 * 3600},
+        ],
+    }
+
+class QuizStats(Document):
+    quiz_id = fields.ObjectIdField(primary_key=True)
+    count = fields.IntField(default=0)
+    score_sum = fields.IntField(default=0)
+    points_sum = fields.IntField(default=0)
+    # score -> number of submissions, question index -> number answered correctly (keys are strings)
+    score_histogram = fields.DictField()
+    question_correct = fields.DictField()
+    # Bumped by every write; quiz_details and the dashboard derive their ETags from it
+    submissions_version = fields.IntField(default=0)
+
+    meta = {"collection": "quiz_stats"}
 
 class UserBase(BaseModel):
     email: EmailStr
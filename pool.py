@@ -0,0 +1,52 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from metrics import Counter, Gauge, Histogram
+
+pool_queue_depth = Gauge("worker_pool_queue_depth", "Jobs waiting for or running on a worker pool", ["pool"])
+pool_job_seconds = Histogram("worker_pool_job_seconds", "Time from submission to completion of a pool job", ["pool"])
+pool_rejected = Counter("worker_pool_rejected_total", "Jobs rejected because the pool queue was full", ["pool"])
+
+class PoolBusy(Exception):
+    pass
+
+# Runs blocking callables off the event loop and rejects new work
+# once max_workers + max_queue jobs are already pending
+class BoundedPool:
+    def __init__(self, name, kind="thread", max_workers=1, max_queue=0):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown pool kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.executor = None
+
+    def start(self):
+        # Process pools must be created after the server forks its workers
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_workers + self.max_queue:
+            pool_rejected.inc(pool=self.name)
+            raise PoolBusy(self.name)
+        self.start()
+        self.pending += 1
+        pool_queue_depth.set(self.pending, pool=self.name)
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+            pool_queue_depth.set(self.pending, pool=self.name)
+            pool_job_seconds.observe(time.perf_counter() - started, pool=self.name)
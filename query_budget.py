@@ -0,0 +1,154 @@
+import functools
+import inspect
+import logging
+from instrumentation import RequestStats, route_label, current_stats
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+query_budget_exceeded = Counter("query_budget_exceeded_total", "Requests that issued more database commands than their route's budget", ["route"])
+
+# Most database commands a route may issue with cold caches, whatever the number of
+# submissions, questions or students involved. None marks routes that scan by design.
+# get_current_user is one find; warm caches only ever lower these counts.
+ROUTE_BUDGETS = {
+    ("POST", "/admin/signup"): 2,
+    ("POST", "/admin/login"): 1,
+    ("GET", "/admin/dashboard"): 3,
+    ("GET", "/admin/quiz_details/{quiz_id}"): 6,  # one more for quizzes without statistics
+    ("GET", "/admin/quiz_details/{quiz_id}/live"): 6,  # likewise
+    ("GET", "/admin/quiz_details/{quiz_id}/export"): None,  # streams every submission
+    ("GET", "/admin/quiz_details/{quiz_id}/analysis"): None,  # one find per REGRADE_BATCH_SIZE submissions
+    ("GET", "/admin/create_quiz"): 1,
+    ("POST", "/admin/create_quiz"): 2,
+    ("GET", "/admin/add_questions/{quiz_id}"): 3,
+    ("POST", "/admin/add_questions/{quiz_id}"): 2,
+    ("POST", "/admin/import_questions/{quiz_id}"): 3,
+    ("POST", "/admin/edit_question/{quiz_id}/{index}"): 3,
+    ("POST", "/admin/delete_question/{quiz_id}/{index}"): 4,
+    ("POST", "/admin/regrade/{quiz_id}"): 2,
+    ("GET", "/admin/regrade/{quiz_id}"): 2,
+    ("GET", "/admin/roster"): 1,
+    ("POST", "/admin/roster"): 1,
+    ("GET", "/admin/roster/{job_id}"): 1,
+    ("GET", "/admin/roster/{job_id}/credentials.csv"): 1,
+    ("POST", "/admin/finish_quiz/{quiz_id}"): 2,
+    ("GET", "/admin/quiz_code/{quiz_id}"): 2,
+    ("POST", "/student/signup"): 2,
+    ("POST", "/student/login"): 1,
+    ("GET", "/student/enter_code"): 1,
+    ("POST", "/student/enter_code"): 3,
+    ("GET", "/student/take_quiz/{quiz_id}"): 3,
+    ("GET", "/student/quiz/{quiz_id}/questions"): 3,
+    ("GET", "/student/quiz/{quiz_id}/questions/{number}"): 3,
+    ("GET", "/student/autosave/{quiz_id}"): 4,
+    ("POST", "/student/autosave/{quiz_id}"): 4,
+    ("GET", "/student/already_taken"): 1,
+    ("POST", "/student/submit_quiz/{quiz_id}"): 8,
+    ("GET", "/student/thank_you"): 1,
+}
+
+class QueryBudgetExceeded(AssertionError):
+    def __init__(self, label, limit, stats):
+        self.label = label
+        self.limit = limit
+        self.count = stats.count
+        super().__init__(f"{label} issued {stats.count} database commands, budget is {limit} ({stats.breakdown() or 'none'})")
+
+# Counts the database commands issued inside the block and raises QueryBudgetExceeded
+# when there are more than limit. Also a decorator for plain and async functions:
+#
+#   async with query_budget(6, "quiz_details") as budget: ...
+#   @query_budget(3)
+#   async def take_quiz(): ...
+class query_budget:
+    def __init__(self, limit, label=None):
+        self.limit = limit
+        self.label = label
+        self.stats = None
+        self._token = None
+
+    @property
+    def count(self):
+        return self.stats.count if self.stats is not None else 0
+
+    def __enter__(self):
+        self.stats = RequestStats(parent=current_stats.get())
+        self._token = current_stats.set(self.stats)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stats.closed = True
+        current_stats.reset(self._token)
+        if exc_type is None and self.limit is not None and self.stats.count > self.limit:
+            raise QueryBudgetExceeded(self.label or "block", self.limit, self.stats)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def __call__(self, fn):
+        label = self.label or fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                async with query_budget(self.limit, label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with query_budget(self.limit, label):
+                return fn(*args, **kwargs)
+        return wrapper
+
+# Staging guard: checks every response against ROUTE_BUDGETS and reports the count in an
+# X-DB-Commands header. "log" records overruns; "raise" turns them into a 500 so they fail loudly.
+# Add it after InstrumentationMiddleware so it runs inside the request's stats.
+class QueryBudgetMiddleware:
+    def __init__(self, app, mode="log", budgets=None):
+        self.app = app
+        self.mode = mode
+        self.budgets = ROUTE_BUDGETS if budgets is None else budgets
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        budget = query_budget(None)
+        replaced = False
+
+        async def send_wrapper(message):
+            nonlocal replaced
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                # Commands after this point (a streamed body) are not part of the check
+                route = route_label(scope)
+                limit = self.budgets.get((method, route))
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-commands", str(budget.count).encode()))
+                message = {**message, "headers": headers}
+                if limit is not None and budget.count > limit:
+                    error = QueryBudgetExceeded(f"{method} {route}", limit, budget.stats)
+                    query_budget_exceeded.inc(route=route)
+                    logger.warning("%s", error)
+                    if self.mode == "raise":
+                        replaced = True
+                        body = str(error).encode()
+                        await send({
+                            "type": "http.response.start",
+                            "status": 500,
+                            "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(body)).encode())],
+                        })
+                        await send({"type": "http.response.body", "body": body})
+                        return
+            await send(message)
+
+        with budget:
+            await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+from pydantic import ValidationError
+from config import Config
+from models import Question, QuestionEmbedded
+
+# Accepted files:
+#   .csv           header "text,correct_option,option_1,option_2,..." (blank trailing options are ignored)
+#   .jsonl/.ndjson one {"text", "options", "correct_option"} object per line
+#   .json          a list of those objects
+
+def _validate(row, label, errors):
+    try:
+        question = Question.model_validate(row)
+    except ValidationError as exc:
+        first = exc.errors()[0]
+        field = ".".join(str(part) for part in first["loc"]) or "row"
+        errors.append(f"{label}: {field} {first['msg'].lower()}")
+        return None
+    if not question.text.strip():
+        errors.append(f"{label}: text is empty")
+        return None
+    if len(question.options) < 2 or not 0 <= question.correct_option < len(question.options):
+        errors.append(f"{label}: invalid options or correct index")
+        return None
+    return QuestionEmbedded(text=question.text, options=question.options, correct_option=question.correct_option)
+
+def _csv_rows(stream):
+    reader = csv.DictReader(stream)
+    option_columns = [name for name in reader.fieldnames or [] if name and name.lower().startswith("option")]
+    for line, record in enumerate(reader, start=2):
+        options = [record[name] for name in option_columns if (record.get(name) or "").strip()]
+        yield f"line {line}", {
+            "text": record.get("text") or "",
+            "options": options,
+            "correct_option": (record.get("correct_option") or "").strip(),
+        }
+
+def _jsonl_rows(stream):
+    for line, raw in enumerate(stream, start=1):
+        if raw.strip():
+            try:
+                yield f"line {line}", json.loads(raw)
+            except json.JSONDecodeError as exc:
+                yield f"line {line}", exc
+
+def _json_rows(stream):
+    try:
+        data = json.load(stream)
+    except json.JSONDecodeError as exc:
+        yield "file", exc
+        return
+    if not isinstance(data, list):
+        yield "file", ValueError("expected a list of questions")
+        return
+    for item, row in enumerate(data, start=1):
+        yield f"item {item}", row
+
+def parse_question_file(filename, binary):
+    # Single streaming pass: every row is validated, nothing is written unless all rows are valid
+    stream = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    name = filename.lower()
+    if name.endswith(".csv"):
+        rows = _csv_rows(stream)
+    elif name.endswith((".jsonl", ".ndjson")):
+        rows = _jsonl_rows(stream)
+    elif name.endswith(".json"):
+        rows = _json_rows(stream)
+    else:
+        return [], ["unsupported file type, use .csv, .json or .jsonl"]
+
+    questions, errors = [], []
+    try:
+        for label, row in rows:
+            if len(questions) >= Config.IMPORT_MAX_QUESTIONS:
+                errors.append(f"more than {Config.IMPORT_MAX_QUESTIONS} questions")
+                break
+            if isinstance(row, Exception):
+                errors.append(f"{label}: {row}")
+                continue
+            question = _validate(row, label, errors)
+            if question is not None:
+                questions.append(question)
+    except UnicodeDecodeError:
+        errors.append("file is not valid UTF-8")
+    finally:
+        stream.detach()
+    return questions, errors
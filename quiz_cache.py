@@ -0,0 +1,103 @@
+import json
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from cache import TTLCache
+from config import Config
+from repository import quizzes
+
+@dataclass(frozen=True)
+class CompiledQuestion:
+    text: str
+    options: Tuple[str, ...]
+    numbered_options: Tuple[Tuple[int, str], ...]
+    # Serialized once per quiz version; a page of the question API is a slice of these
+    payload: bytes
+
+@dataclass(frozen=True)
+class CompiledQuiz:
+    id: ObjectId
+    version: int
+    title: str
+    code: str
+    duration_minutes: int
+    total_points: int
+    questions: Tuple[CompiledQuestion, ...]
+    answer_key: Tuple[int, ...]
+
+    def score(self, answers) -> int:
+        return sum(1 for given, correct in zip(answers, self.answer_key) if given == correct)
+
+    def questions_json(self, offset, limit) -> bytes:
+        return b"[" + b",".join(q.payload for q in self.questions[offset:offset + limit]) + b"]"
+
+def _question_json(number, question) -> bytes:
+    data = {"number": number, "text": question.text, "options": list(question.options)}
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def compile_quiz(quiz) -> CompiledQuiz:
+    questions = tuple(
+        CompiledQuestion(
+            text=q.text,
+            options=tuple(q.options),
+            numbered_options=tuple(enumerate(q.options)),
+            payload=_question_json(number, q),
+        )
+        for number, q in enumerate(quiz.questions, start=1)
+    )
+    return CompiledQuiz(
+        id=quiz.id,
+        version=quiz.version or 0,
+        title=quiz.title,
+        code=quiz.code,
+        duration_minutes=quiz.duration_minutes,
+        total_points=quiz.total_points,
+        questions=questions,
+        answer_key=tuple(q.correct_option for q in quiz.questions),
+    )
+
+compiled_quizzes = TTLCache("compiled_quiz", maxsize=Config.QUIZ_CACHE_SIZE)
+# Quiz codes never change once issued, so code -> id needs no invalidation
+quiz_ids_by_code = TTLCache("quiz_code", maxsize=Config.QUIZ_CACHE_SIZE * 4)
+
+def _object_id(quiz_id) -> Optional[ObjectId]:
+    if isinstance(quiz_id, ObjectId):
+        return quiz_id
+    try:
+        return ObjectId(quiz_id)
+    except (InvalidId, TypeError):
+        return None
+
+async def get_compiled_quiz(quiz_id, version=None) -> Optional[CompiledQuiz]:
+    quiz_id = _object_id(quiz_id)
+    if quiz_id is None:
+        return None
+    # A projected version read is all it takes to know whether the cached copy is current;
+    # callers that already read the quiz's markers pass the version in
+    if version is None:
+        version = await quizzes.get_version(quiz_id)
+    if version is None:
+        compiled_quizzes.pop(quiz_id)
+        return None
+    compiled = compiled_quizzes.get(quiz_id)
+    if compiled is not None and compiled.version == version:
+        return compiled
+    quiz = await quizzes.get(id=quiz_id)
+    if quiz is None:
+        return None
+    compiled = compile_quiz(quiz)
+    compiled_quizzes.set(quiz_id, compiled)
+    return compiled
+
+async def get_quiz_id_by_code(code: str) -> Optional[ObjectId]:
+    quiz_id = quiz_ids_by_code.get(code)
+    if quiz_id is not None:
+        return quiz_id
+    quiz_id = await quizzes.get_id_by_code(code)
+    if quiz_id is not None:
+        quiz_ids_by_code.set(code, quiz_id)
+    return quiz_id
+
+def invalidate(quiz_id):
+    compiled_quizzes.pop(_object_id(quiz_id))
@@ -0,0 +1,73 @@
+import struct
+import zlib
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+from markupsafe import Markup
+from cache import TTLCache
+from config import Config
+from static_assets import accepted_encodings
+
+BODY_MARKER = "<!--quiz-body-->"
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+def _deflate(data, mode):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(mode)
+
+# The question list of one quiz version, rendered once and shared by every student.
+# deflated is a raw deflate stream ending on a sync flush, so it can be spliced
+# between separately compressed per-request wrapper parts.
+class RenderedFragment:
+    def __init__(self, version, html, compress):
+        self.version = version
+        self.html = html
+        self.raw = html.encode("utf-8")
+        self.deflated = _deflate(self.raw, zlib.Z_SYNC_FLUSH) if compress else None
+
+    @property
+    def nbytes(self):
+        return len(self.raw) + len(self.deflated or b"")
+
+fragments = TTLCache("quiz_html", maxsize=Config.QUIZ_HTML_CACHE_BYTES, weigher=lambda f: f.nbytes)
+
+def get_body_fragment(env, quiz):
+    fragment = fragments.get(quiz.id)
+    if fragment is None or fragment.version != quiz.version:
+        # Large quizzes ship only the first page inline; the rest comes from the question API on demand
+        total = len(quiz.questions)
+        inline = total if total <= Config.LAZY_QUIZ_THRESHOLD else Config.QUESTION_PAGE_SIZE
+        html = env.get_template("take_quiz_body.html").render(
+            quiz=quiz, questions=quiz.questions[:inline], total=total, page_size=Config.QUESTION_PAGE_SIZE
+        )
+        fragment = RenderedFragment(quiz.version, html, compress=Config.QUIZ_HTML_GZIP)
+        fragments.set(quiz.id, fragment)
+    return fragment
+
+def assemble_gzip(prefix, fragment, suffix):
+    crc = zlib.crc32(prefix)
+    crc = zlib.crc32(fragment.raw, crc)
+    crc = zlib.crc32(suffix, crc)
+    size = len(prefix) + len(fragment.raw) + len(suffix)
+    return b"".join([
+        GZIP_HEADER,
+        _deflate(prefix, zlib.Z_SYNC_FLUSH),
+        fragment.deflated,
+        _deflate(suffix, zlib.Z_FINISH),
+        struct.pack("<II", crc & 0xFFFFFFFF, size & 0xFFFFFFFF),
+    ])
+
+def take_quiz_response(templates, request: Request, quiz):
+    # Only the wrapper around the cached question list is rendered per request
+    fragment = get_body_fragment(templates.env, quiz)
+    page = templates.env.get_template("take_quiz.html").render(
+        request=request, quiz=quiz, duration=quiz.duration_minutes, quiz_body=Markup(BODY_MARKER),
+        autosave_interval=Config.AUTOSAVE_INTERVAL,
+    )
+    prefix, suffix = page.split(BODY_MARKER, 1)
+    if fragment.deflated is not None and "gzip" in accepted_encodings(request.headers.get("accept-encoding", "")):
+        return Response(
+            assemble_gzip(prefix.encode("utf-8"), fragment, suffix.encode("utf-8")),
+            media_type="text/html",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+        )
+    return HTMLResponse(prefix + fragment.html + suffix, headers={"Vary": "Accept-Encoding"})
@@ -0,0 +1,176 @@
+import logging
+import time
+from collections import Counter
+import numpy as np
+from config import Config
+from instrumentation import background_task
+from live import live_feed
+from models import QuizStats
+from repository import quizzes, submissions, quiz_stats
+
+logger = logging.getLogger(__name__)
+
+# Choices outside 0..MAX_CHOICE (stored before submit_quiz checked them) read as unanswered
+MAX_CHOICE = np.iinfo(np.int32).max
+
+def _choices(given):
+    return [value if isinstance(value, int) and 0 <= value <= MAX_CHOICE else -1 for value in given]
+
+def answer_matrix(batch, question_count):
+    # students x questions, unanswered or missing positions are -1
+    answers = [son.get("answers") or [] for son in batch]
+    if all(len(a) == question_count for a in answers):
+        try:
+            matrix = np.array(answers, dtype=np.int64).reshape(len(answers), question_count)
+        except (OverflowError, TypeError, ValueError):
+            matrix = np.array([_choices(a) for a in answers], dtype=np.int64).reshape(len(answers), question_count)
+        matrix[(matrix < 0) | (matrix > MAX_CHOICE)] = -1
+        return matrix.astype(np.int32)
+    matrix = np.full((len(answers), question_count), -1, dtype=np.int32)
+    for row, given in enumerate(answers):
+        given = _choices(given[:question_count])
+        matrix[row, :len(given)] = given
+    return matrix
+
+class RegradeJob:
+    def __init__(self, quiz_id):
+        self.quiz_id = quiz_id
+        self.status = "pending"
+        self.total = 0
+        self.done = 0
+        self.changed = 0
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.rerun = False
+        self.task = None
+
+    def as_dict(self):
+        return {
+            "quiz_id": str(self.quiz_id),
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "changed": self.changed,
+            "error": self.error,
+            "seconds": round((self.finished_at or time.monotonic()) - self.started_at, 3) if self.started_at else None,
+        }
+
+async def _rescore(quiz, batch_size=5000, progress=None):
+    # Scores every submission against the current answer key and saves the scores that changed;
+    # returns the statistics of the scanned submissions, the score_sum and score_histogram $inc
+    # that moves the rescored ones from their old score to the new one, and how many were rescored
+    key = np.array([q.correct_option for q in quiz.questions], dtype=np.int32)
+    question_count = len(key)
+    total = await submissions.count_for_quiz(quiz.id)
+    done = changed = 0
+    score_sum = points_sum = 0
+    histogram = np.zeros(question_count + 1, dtype=np.int64)
+    question_correct = np.zeros(question_count, dtype=np.int64)
+    inc = Counter()
+
+    async for batch in submissions.iter_answer_batches(quiz.id, batch_size=batch_size):
+        correct = answer_matrix(batch, question_count) == key
+        scores = correct.sum(axis=1)
+        old_scores = np.array([-1 if son.get("score") is None else son["score"] for son in batch])
+        rescored = np.flatnonzero(scores != old_scores)
+        updates = [(batch[i]["_id"], int(scores[i])) for i in rescored]
+        await submissions.set_scores(updates)
+
+        if question_count:
+            points = np.round(scores / question_count * quiz.total_points)
+            points_sum += int(points.sum())
+        for i in rescored:
+            new, old = int(scores[i]), int(old_scores[i])
+            inc["score_sum"] += new
+            inc[f"score_histogram.{new}"] += 1
+            if old >= 0:
+                inc["score_sum"] -= old
+                inc[f"score_histogram.{old}"] -= 1
+        score_sum += int(scores.sum())
+        histogram += np.bincount(scores, minlength=question_count + 1)
+        question_correct += correct.sum(axis=0)
+        done += len(batch)
+        changed += len(updates)
+        if progress is not None:
+            progress(done, max(total, done), changed)
+
+    stats = QuizStats(
+        quiz_id=quiz.id,
+        count=done,
+        score_sum=score_sum,
+        points_sum=points_sum,
+        score_histogram={str(score): int(n) for score, n in enumerate(histogram) if n},
+        question_correct={str(index): int(n) for index, n in enumerate(question_correct) if n},
+    )
+    return stats, inc, changed
+
+async def regrade_quiz(quiz, batch_size=5000, progress=None):
+    # Rescores every submission against the current answer key and corrects the quiz statistics
+    # with $inc, so submissions counted while the scan runs are kept
+    before = (await quiz_stats.for_quizzes([quiz.id])).get(quiz.id)
+    stats, inc, changed = await _rescore(quiz, batch_size, progress)
+    if before is None:
+        # Submissions from before statistics were tracked: count them all
+        inc = Counter({"count": stats.count, "score_sum": stats.score_sum})
+        inc.update({f"score_histogram.{score}": n for score, n in stats.score_histogram.items()})
+        before = QuizStats(quiz_id=quiz.id)
+    # Points and per-question counts also depend on the old question count and key, which are gone,
+    # so they are corrected against the values read before the scan; a submission accepted
+    # mid-scan may be counted twice in them until manage.py rebuild-stats
+    inc["points_sum"] = stats.points_sum - before.points_sum
+    for index in set(stats.question_correct) | set(before.question_correct):
+        inc[f"question_correct.{index}"] = stats.question_correct.get(index, 0) - before.question_correct.get(index, 0)
+    inc = {field: amount for field, amount in inc.items() if amount}
+    # Rescored rows change quiz_details even when the totals come out the same
+    if inc or changed:
+        await quiz_stats.apply(quiz.id, inc)
+        await live_feed.reseed(quiz)
+    return stats.count, changed
+
+async def rebuild_stats(quiz, batch_size=5000):
+    # manage.py rebuild-stats: recounted from scratch, which also repairs counters whose update was lost
+    stats, _, _ = await _rescore(quiz, batch_size)
+    await quiz_stats.replace(stats)
+    await live_feed.reseed(quiz)
+    return stats
+
+jobs = {}
+
+async def _run(job):
+    while True:
+        job.rerun = False
+        job.status = "running"
+        job.started_at = time.monotonic()
+        job.finished_at = None
+        job.done = job.changed = 0
+        try:
+            quiz = await quizzes.get(id=job.quiz_id)
+            if quiz is None:
+                raise LookupError("Quiz not found")
+
+            def progress(done, total, changed):
+                job.done, job.total, job.changed = done, total, changed
+
+            await regrade_quiz(quiz, batch_size=Config.REGRADE_BATCH_SIZE, progress=progress)
+            job.status = "finished"
+        except Exception as exc:
+            logger.exception("Regrade of quiz %s failed", job.quiz_id)
+            job.status = "failed"
+            job.error = str(exc)
+        job.finished_at = time.monotonic()
+        # The quiz was edited again while this pass was running
+        if not job.rerun:
+            break
+
+def schedule_regrade(quiz_id):
+    job = jobs.get(quiz_id)
+    if job is not None and job.task is not None and not job.task.done():
+        job.rerun = True
+        return job
+    job = jobs[quiz_id] = RegradeJob(quiz_id)
+    job.task = background_task(_run(job))
+    return job
+
+def get_job(quiz_id):
+    return jobs.get(quiz_id)
@@ -0,0 +1,474 @@
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from mongoengine.errors import ValidationError
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from mongoengine.queryset import transform
+from pymongo import ReturnDocument, UpdateOne
+from models import User, Quiz, QuestionEmbedded, QuizStats, Submission, Draft
+from database import get_db
+
+def points_for(score, total_questions, total_points):
+    if total_questions <= 0:
+        return 0
+    return round((score / total_questions) * total_points)
+
+# Largest $slice count; used to mean "through the end of the array"
+_SLICE_TO_END = 2**31 - 1
+
+def _splice_out(array, index):
+    return {"$concatArrays": [
+        {"$slice": [array, index]},
+        {"$slice": [array, index + 1, _SLICE_TO_END]},
+    ]}
+
+class Repository:
+    model = None
+
+    @property
+    def collection(self):
+        return get_db()[self.model._get_collection_name()]
+
+    def _query(self, filters):
+        # Reuse mongoengine's field names and value conversion (e.g. str -> ObjectId)
+        return transform.query(self.model, **filters)
+
+    def _load(self, son):
+        if son is None:
+            return None
+        return self.model._from_son(son)
+
+    async def get(self, **filters):
+        try:
+            query = self._query(filters)
+        except ValidationError:
+            return None
+        return self._load(await self.collection.find_one(query))
+
+    async def exists(self, **filters):
+        try:
+            query = self._query(filters)
+        except ValidationError:
+            return False
+        return await self.collection.find_one(query, projection={"_id": 1}) is not None
+
+    async def find(self, sort=None, **filters):
+        cursor = self.collection.find(self._query(filters))
+        if sort:
+            cursor = cursor.sort(sort)
+        return [self._load(son) async for son in cursor]
+
+    async def insert(self, document):
+        document.validate()
+        son = document.to_mongo()
+        son.pop("_id", None)
+        result = await self.collection.insert_one(son)
+        document.id = result.inserted_id
+        return document
+
+    async def insert_many_once(self, batch):
+        # Unordered bulk insert; per item returns True (inserted), False (duplicate key) or the write error
+        sons = []
+        for document in batch:
+            document.validate()
+            son = document.to_mongo()
+            son.pop("_id", None)
+            sons.append(son)
+        results = [True] * len(sons)
+        try:
+            await self.collection.insert_many(sons, ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get("writeErrors", []):
+                if error.get("code") == 11000:
+                    results[error["index"]] = False
+                else:
+                    results[error["index"]] = BulkWriteError({"writeErrors": [error]})
+        for document, son, result in zip(batch, sons, results):
+            if result is True:
+                document.id = son["_id"]
+        return results
+
+class UserRepository(Repository):
+    model = User
+
+    async def profiles_by_email(self, emails):
+        profiles = {}
+        cursor = self.collection.find(
+            {"email": {"$in": list(emails)}}, projection={"email": 1, "name": 1, "school_id": 1}
+        )
+        async for son in cursor:
+            profiles[son["email"]] = son
+        return profiles
+
+    async def existing_emails(self, emails):
+        cursor = self.collection.find({"email": {"$in": list(emails)}}, projection={"email": 1, "_id": 0})
+        return {son["email"] async for son in cursor}
+
+class QuizRepository(Repository):
+    model = Quiz
+
+    async def get_version(self, quiz_id):
+        son = await self.collection.find_one({"_id": quiz_id}, projection={"version": 1})
+        if son is None:
+            return None
+        return son.get("version", 0)
+
+    async def get_markers(self, quiz_id):
+        # Everything a conditional GET needs, from one _id lookup
+        query = self._id_filter(quiz_id)
+        if query is None:
+            return None
+        return await self.collection.find_one(
+            query, projection={"version": 1, "modified_at": 1, "creator_email": 1}
+        )
+
+    async def get_id_by_code(self, code):
+        son = await self.collection.find_one({"code": code}, projection={"_id": 1})
+        return son["_id"] if son else None
+
+    def _id_filter(self, quiz_id):
+        try:
+            return self._query({"id": quiz_id})
+        except ValidationError:
+            return None
+
+    async def list_for_creator(self, creator_email, before=None, limit=20):
+        # Dashboard listing: newest first, keyset-paginated on _id, never loads the questions themselves
+        match = {"creator_email": creator_email}
+        if before is not None:
+            match["_id"] = {"$lt": before}
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"_id": -1}},
+            {"$limit": limit + 1},
+            {"$project": {
+                "_id": 0,
+                "id": "$_id",
+                "title": 1,
+                "code": 1,
+                "version": 1,
+                "duration_minutes": 1,
+                "total_points": 1,
+                "question_count": {"$size": {"$ifNull": ["$questions", []]}},
+            }},
+        ]
+        # One round-trip whatever the page size (the default first batch is 101 documents)
+        cursor = await self.collection.aggregate(pipeline, batchSize=limit + 1)
+        rows = await cursor.to_list(length=limit + 1)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = str(rows[-1]["id"])
+        return rows, next_cursor
+
+    async def push_questions(self, quiz_id, questions):
+        # One atomic append for any number of questions; bumps the version for cached copies
+        query = self._id_filter(quiz_id)
+        if query is None:
+            return False
+        sons = []
+        for question in questions:
+            question.validate()
+            sons.append(question.to_mongo())
+        result = await self.collection.update_one(
+            query,
+            {"$push": {"questions": {"$each": sons}}, "$inc": {"version": 1}, "$set": {"modified_at": datetime.utcnow()}},
+        )
+        return result.matched_count == 1
+
+    async def set_question(self, quiz_id, index, question):
+        # Positional replace; returns the question it replaced, or None if there was none
+        query = self._id_filter(quiz_id)
+        if query is None or index < 0:
+            return None
+        question.validate()
+        before = await self.collection.find_one_and_update(
+            {**query, f"questions.{index}": {"$exists": True}},
+            {"$set": {f"questions.{index}": question.to_mongo(), "modified_at": datetime.utcnow()}, "$inc": {"version": 1}},
+            projection={"questions": {"$slice": [index, 1]}},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if before is None:
+            return None
+        return QuestionEmbedded._from_son(before["questions"][0])
+
+    async def remove_question(self, quiz_id, index):
+        # $pull cannot remove by position, so splice the array in a single pipeline update.
+        # Returns the quiz version after the delete, or None if there was no such question
+        query = self._id_filter(quiz_id)
+        if query is None or index < 0:
+            return None
+        after = await self.collection.find_one_and_update(
+            {**query, f"questions.{index}": {"$exists": True}},
+            [{"$set": {
+                "questions": _splice_out("$questions", index),
+                "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                "modified_at": datetime.utcnow(),
+            }}],
+            projection={"version": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        return None if after is None else after["version"]
+
+class SubmissionRepository(Repository):
+    model = Submission
+
+    async def insert_once(self, submission):
+        # Relies on the unique (quiz_id, student_email) index; a repeat returns the stored record
+        try:
+            return await self.insert(submission), True
+        except DuplicateKeyError:
+            existing = await self.get(quiz_id=submission.quiz_id, student_email=submission.student_email)
+            return existing, False
+
+    @staticmethod
+    def _points_expr(total_questions, total_points):
+        if total_questions <= 0:
+            return {"$literal": 0}
+        return {"$toInt": {"$round": [{"$multiply": [{"$divide": ["$score", total_questions]}, total_points]}, 0]}}
+
+    async def totals(self, quiz_id, total_questions, total_points):
+        # The count and sums quiz_stats keeps, computed from the submissions themselves
+        pipeline = [
+            {"$match": {"quiz_id": quiz_id}},
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "score_sum": {"$sum": "$score"},
+                "points_sum": {"$sum": self._points_expr(total_questions, total_points)},
+            }},
+            {"$project": {"_id": 0}},
+        ]
+        cursor = await self.collection.aggregate(pipeline)
+        rows = await cursor.to_list(length=1)
+        if not rows:
+            return {"count": 0, "score_sum": 0, "points_sum": 0}
+        return rows[0]
+
+    async def summary(self, quiz_id, total_questions, total_points):
+        totals = await self.totals(quiz_id, total_questions, total_points)
+        count = totals["count"]
+        return {
+            "total_students": count,
+            "avg_correct": round(totals["score_sum"] / count, 1) if count else 0,
+            "avg_points": round(totals["points_sum"] / count, 1) if count else 0,
+        }
+
+    async def page_with_students(self, quiz_id, total_questions, total_points, before=None, limit=50):
+        # Newest first, keyset-paginated on (submitted_at, _id); students are joined in the same round-trip
+        match = {"quiz_id": quiz_id}
+        if before is not None:
+            submitted_at, last_id = before
+            match["$or"] = [
+                {"submitted_at": {"$lt": submitted_at}},
+                {"submitted_at": submitted_at, "_id": {"$lt": last_id}},
+            ]
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"submitted_at": -1, "_id": -1}},
+            {"$limit": limit + 1},
+            {"$lookup": {
+                "from": User._get_collection_name(),
+                "localField": "student_email",
+                "foreignField": "email",
+                "as": "student",
+            }},
+            {"$project": {
+                "student_email": 1,
+                "score": 1,
+                "submitted_at": 1,
+                "points_earned": self._points_expr(total_questions, total_points),
+                "name": {"$arrayElemAt": ["$student.name", 0]},
+                "school_id": {"$arrayElemAt": ["$student.school_id", 0]},
+            }},
+        ]
+        cursor = await self.collection.aggregate(pipeline, batchSize=limit + 1)
+        rows = await cursor.to_list(length=limit + 1)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["submitted_at"], rows[-1]["_id"])
+        return rows, next_cursor
+
+    async def iter_with_students(self, quiz_id, batch_size=500):
+        # Streams (submission, student) pairs; students are fetched with one $in query per batch
+        cursor = self.collection.find(
+            {"quiz_id": quiz_id},
+            projection={"student_email": 1, "answers": 1, "score": 1, "submitted_at": 1},
+        ).sort([("submitted_at", -1), ("_id", -1)]).batch_size(batch_size)
+        batch = []
+        async for son in cursor:
+            batch.append(son)
+            if len(batch) >= batch_size:
+                for pair in await self._join_students(batch):
+                    yield pair
+                batch = []
+        if batch:
+            for pair in await self._join_students(batch):
+                yield pair
+
+    async def iter_answer_batches(self, quiz_id, batch_size=5000):
+        # Yields lists of {_id, answers, score} without materialising the whole quiz
+        cursor = self.collection.find(
+            {"quiz_id": quiz_id}, projection={"answers": 1, "score": 1}
+        ).batch_size(batch_size)
+        batch = []
+        async for son in cursor:
+            batch.append(son)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def count_for_quiz(self, quiz_id):
+        return await self.collection.count_documents({"quiz_id": quiz_id})
+
+    async def set_scores(self, scores):
+        # scores is a list of (submission _id, new score)
+        if scores:
+            await self.collection.bulk_write(
+                [UpdateOne({"_id": _id}, {"$set": {"score": score}}) for _id, score in scores],
+                ordered=False,
+            )
+
+    async def drop_answer(self, quiz_id, index, version):
+        # Keeps stored answer vectors aligned with the questions after one is deleted. version is
+        # the quiz version the delete produced: submissions given against it are already aligned
+        await self.collection.update_many(
+            {"quiz_id": quiz_id, f"answers.{index}": {"$exists": True}, "quiz_version": {"$not": {"$gte": version}}},
+            [{"$set": {"answers": _splice_out("$answers", index)}}],
+        )
+
+    async def _join_students(self, batch):
+        students = await users.profiles_by_email({son["student_email"] for son in batch})
+        return [(son, students.get(son["student_email"])) for son in batch]
+
+class QuizStatsRepository(Repository):
+    model = QuizStats
+
+    @staticmethod
+    def increments(answer_key, total_points, answers, score):
+        inc = {
+            "count": 1,
+            "score_sum": score,
+            "points_sum": points_for(score, len(answer_key), total_points),
+            f"score_histogram.{score}": 1,
+        }
+        for index, (given, correct) in enumerate(zip(answers, answer_key)):
+            if given == correct:
+                inc[f"question_correct.{index}"] = 1
+        return inc
+
+    # Every write bumps submissions_version, so pages showing submissions can be validated
+    # against it instead of a timestamp
+    async def apply(self, quiz_id, inc):
+        await self.collection.update_one({"_id": quiz_id}, {"$inc": {**inc, "submissions_version": 1}}, upsert=True)
+
+    async def apply_many(self, incs):
+        # incs is a list of (quiz_id, inc); merged so each quiz gets a single upsert
+        merged = {}
+        for quiz_id, inc in incs:
+            target = merged.setdefault(quiz_id, {"submissions_version": 0})
+            target["submissions_version"] += 1
+            for field, amount in inc.items():
+                target[field] = target.get(field, 0) + amount
+        if merged:
+            await self.collection.bulk_write(
+                [UpdateOne({"_id": quiz_id}, {"$inc": inc}, upsert=True) for quiz_id, inc in merged.items()],
+                ordered=False,
+            )
+
+    async def counts_for_quizzes(self, quiz_ids):
+        # Submission counts and the submissions_version they were read at, per quiz
+        counts, versions = {}, {}
+        cursor = self.collection.find({"_id": {"$in": list(quiz_ids)}}, projection={"count": 1, "submissions_version": 1})
+        async for son in cursor:
+            counts[son["_id"]] = son.get("count", 0)
+            versions[son["_id"]] = son.get("submissions_version", 0)
+        return counts, versions
+
+    async def for_quizzes(self, quiz_ids):
+        stats = {}
+        async for son in self.collection.find({"_id": {"$in": list(quiz_ids)}}):
+            stats[son["_id"]] = self._load(son)
+        return stats
+
+    async def replace(self, stats):
+        # Overwrites the totals but keeps counting submissions_version up
+        son = {
+            field.db_field: field.to_mongo(stats[name])
+            for name, field in QuizStats._fields.items()
+            if name not in ("quiz_id", "submissions_version")
+        }
+        await self.collection.update_one(
+            {"_id": stats.quiz_id}, {"$set": son, "$inc": {"submissions_version": 1}}, upsert=True
+        )
+
+class DraftRepository(Repository):
+    model = Draft
+
+    async def upsert_many(self, changes, updated_at):
+        # changes maps (quiz_id, student_email) -> {question index: option}; one upsert per draft
+        if changes:
+            await self.collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"quiz_id": quiz_id, "student_email": student_email},
+                        {"$set": {**{f"answers.{index}": option for index, option in answers.items()}, "updated_at": updated_at}},
+                        upsert=True,
+                    )
+                    for (quiz_id, student_email), answers in changes.items()
+                ],
+                ordered=False,
+            )
+
+    async def answers_for(self, quiz_id, student_email):
+        son = await self.collection.find_one(
+            {"quiz_id": quiz_id, "student_email": student_email}, projection={"answers": 1}
+        )
+        if son is None:
+            return {}
+        return {int(index): option for index, option in son.get("answers", {}).items()}
+
+    async def drop_answer(self, quiz_id, index):
+        # Draft answers are keyed by question index: drop the deleted one and move later ones down
+        position = {"$toInt": "$$answer.k"}
+        await self.collection.update_many(
+            {"quiz_id": quiz_id},
+            [{"$set": {"answers": {"$arrayToObject": {"$map": {
+                "input": {"$filter": {
+                    "input": {"$objectToArray": {"$ifNull": ["$answers", {}]}},
+                    "as": "answer",
+                    "cond": {"$ne": [position, index]},
+                }},
+                "as": "answer",
+                "in": {
+                    "k": {"$toString": {"$cond": [{"$gt": [position, index]}, {"$subtract": [position, 1]}, position]}},
+                    "v": "$$answer.v",
+                },
+            }}}}}],
+        )
+
+    async def delete_many(self, keys):
+        by_quiz = {}
+        for quiz_id, student_email in keys:
+            by_quiz.setdefault(quiz_id, []).append(student_email)
+        for quiz_id, emails in by_quiz.items():
+            await self.collection.delete_many({"quiz_id": quiz_id, "student_email": {"$in": emails}})
+
+def encode_cursor(submitted_at, last_id):
+    return f"{submitted_at.isoformat()}_{last_id}"
+
+def decode_cursor(value):
+    try:
+        submitted_at, last_id = value.split("_", 1)
+        return datetime.fromisoformat(submitted_at), ObjectId(last_id)
+    except (ValueError, InvalidId):
+        return None
+
+users = UserRepository()
+quizzes = QuizRepository()
+submissions = SubmissionRepository()
+quiz_stats = QuizStatsRepository()
+drafts = DraftRepository()
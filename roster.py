@@ -0,0 +1,191 @@
+import asyncio
+import csv
+import io
+import logging
+import secrets
+import time
+import uuid
+from email_validator import EmailNotValidError, validate_email
+from auth import get_password_hash
+from config import Config
+from instrumentation import background_task
+from models import User
+from pool import BoundedPool
+from repository import users
+
+logger = logging.getLogger(__name__)
+
+# Accepted file: .csv with header "school_id,name,email" and an optional "password" column.
+# Students without a password get a generated one, handed back once in the credentials CSV.
+
+REQUIRED_COLUMNS = ("school_id", "name", "email")
+
+# bcrypt is CPU bound; a separate process pool keeps bulk hashing away from the login hash pool
+roster_pool = BoundedPool(
+    "roster", kind="process", max_workers=Config.ROSTER_HASH_WORKERS, max_queue=Config.ROSTER_BATCH_SIZE
+)
+# Imports running side by side share the pool: they wait for a slot instead of getting PoolBusy
+roster_slots = asyncio.Semaphore(Config.ROSTER_HASH_WORKERS + Config.ROSTER_BATCH_SIZE)
+
+async def _hash(password):
+    async with roster_slots:
+        return await roster_pool.run(get_password_hash, password)
+
+class RosterRow:
+    def __init__(self, line, school_id, name, email, password=None):
+        self.line = line
+        self.school_id = school_id
+        self.name = name
+        self.email = email
+        self.password = password
+        self.generated = password is None
+
+def parse_roster(binary):
+    # Returns (rows, errors); errors are (line, email, message) and do not stop the other rows
+    stream = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    rows, errors, seen = [], [], {}
+    try:
+        reader = csv.DictReader(stream)
+        columns = {(name or "").strip().lower(): name for name in reader.fieldnames or []}
+        missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+        if missing:
+            return [], [(1, "", f"missing column(s): {', '.join(missing)}")]
+        for line, record in enumerate(reader, start=2):
+            if len(rows) >= Config.ROSTER_MAX_ROWS:
+                errors.append((line, "", f"more than {Config.ROSTER_MAX_ROWS} students"))
+                break
+            values = {column: (record.get(columns[column]) or "").strip() for column in REQUIRED_COLUMNS}
+            password = (record.get(columns["password"]) or "") if "password" in columns else ""
+            if not all(values.values()):
+                errors.append((line, values["email"], "school_id, name and email are required"))
+                continue
+            try:
+                email = validate_email(values["email"], check_deliverability=False).normalized
+            except EmailNotValidError as exc:
+                errors.append((line, values["email"], str(exc)))
+                continue
+            if email in seen:
+                errors.append((line, email, f"duplicate of line {seen[email]}"))
+                continue
+            seen[email] = line
+            rows.append(RosterRow(line, values["school_id"], values["name"], email, password or None))
+    except UnicodeDecodeError:
+        errors.append((0, "", "file is not valid UTF-8"))
+    finally:
+        stream.detach()
+    return rows, errors
+
+class RosterJob:
+    def __init__(self, created_by, filename):
+        self.id = uuid.uuid4().hex
+        self.created_by = created_by
+        self.filename = filename
+        self.status = "pending"
+        self.total = 0
+        self.done = 0
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+        self.credentials = []
+        self.credentials_downloaded = False
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "created": self.created,
+            "skipped": self.skipped,
+            "errors": [{"line": line, "email": email, "message": message} for line, email, message in self.errors],
+            "error": self.error,
+            "seconds": round((self.finished_at or time.monotonic()) - self.started_at, 3) if self.started_at else None,
+        }
+
+async def provision_roster(rows, job, batch_size=500):
+    # Per batch: one $in query for existing accounts, parallel hashing, one unordered insert_many
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        existing = await users.existing_emails(row.email for row in batch)
+        fresh = []
+        for row in batch:
+            if row.email in existing:
+                job.skipped += 1
+                job.errors.append((row.line, row.email, "already registered, skipped"))
+            else:
+                fresh.append(row)
+        for row in fresh:
+            if row.generated:
+                row.password = secrets.token_urlsafe(9)
+        hashes = await asyncio.gather(*(_hash(row.password) for row in fresh))
+        documents = [
+            User(school_id=row.school_id, name=row.name, email=row.email, hashed_password=hashed, role="student")
+            for row, hashed in zip(fresh, hashes)
+        ]
+        results = await users.insert_many_once(documents) if documents else []
+        for row, result in zip(fresh, results):
+            if result is True:
+                job.created += 1
+                if row.generated:
+                    job.credentials.append((row.school_id, row.name, row.email, row.password))
+            elif result is False:
+                # Registered by someone else between the lookup and the insert
+                job.skipped += 1
+                job.errors.append((row.line, row.email, "already registered, skipped"))
+            else:
+                job.errors.append((row.line, row.email, str(result)))
+        job.done += len(batch)
+
+jobs = {}
+
+async def _run(job, rows):
+    job.status = "running"
+    job.started_at = time.monotonic()
+    try:
+        await provision_roster(rows, job, batch_size=Config.ROSTER_BATCH_SIZE)
+        job.status = "finished"
+    except Exception as exc:
+        logger.exception("Roster import %s failed", job.id)
+        job.status = "failed"
+        job.error = str(exc)
+    job.finished_at = time.monotonic()
+
+def start_import(created_by, filename, rows, errors):
+    job = RosterJob(created_by, filename)
+    job.total = len(rows) + len(errors)
+    job.done = len(errors)
+    job.errors.extend(errors)
+    # Only the most recent jobs are kept; their credentials live in memory until evicted
+    while len(jobs) >= Config.ROSTER_JOBS_KEPT:
+        oldest = next((key for key, old in jobs.items() if old.task is None or old.task.done()), None)
+        if oldest is None:
+            break
+        del jobs[oldest]
+    jobs[job.id] = job
+    job.task = background_task(_run(job, rows))
+    return job
+
+def get_job(job_id):
+    return jobs.get(job_id)
+
+def latest_job(created_by):
+    return next((job for job in reversed(list(jobs.values())) if job.created_by == created_by), None)
+
+def credentials_csv(job):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["school_id", "name", "email", "password"])
+    writer.writerows(job.credentials)
+    return buffer.getvalue()
+
+def take_credentials_csv(job):
+    # Generated passwords are handed out once, then dropped from memory
+    body = credentials_csv(job)
+    job.credentials = []
+    job.credentials_downloaded = True
+    return body
@@ -1,19 +1,28 @@
-from fastapi import APIRouter, Depends, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
-from models import AdminCreate, QuizCreate, QuestionEmbedded, Quiz, Submission, User
-from auth import get_password_hash, create_access_token, get_current_user, verify_password
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Depends, Request, Form, HTTPException, Query, UploadFile, File
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from models import AdminCreate, QuizCreate, QuestionEmbedded, Quiz, User
+from auth import get_password_hash_async, create_access_token, get_current_user, invalidate_user, verify_password_async
+from repository import users, quizzes, submissions, quiz_stats, decode_cursor, points_for
+from config import Config
+import quiz_cache
+from regrade import get_job, schedule_regrade
+from analysis import get_item_analysis
+from question_import import parse_question_file
+from live import format_event, live_feed
+from autosave import autosave_buffer
+from http_cache import add_validators, conditional_response, page_etag
+import roster
+from bson import ObjectId
+from templating import templates
+import asyncio
 import uuid
+import csv
+import io
+import json
+from typing import Optional
 from datetime import datetime
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
-
-ADMIN_SECRET = os.getenv("ADMIN_SECRET")
 
 @router.get("/signup", response_class=HTMLResponse)
 async def admin_signup_page(request: Request):
@@ -26,13 +35,14 @@ async def admin_signup(
     password: str = Form(...),
     secret_code: str = Form(...)
 ):
-    if secret_code != str(ADMIN_SECRET):
+    if secret_code != Config.ADMIN_SECRET:
         raise HTTPException(status_code=400, detail="Invalid secret code")
-    if User.objects(email=email).first():
+    if await users.exists(email=email):
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash_async(password)
     user = User(name=name, email=email, hashed_password=hashed_password, role="admin")
-    user.save()
+    await users.insert(user)
+    invalidate_user(user.email)
     return RedirectResponse(url="/admin/login", status_code=303)
 
 @router.get("/login", response_class=HTMLResponse)
@@ -41,9 +51,8 @@ async def admin_login_page(request: Request):
 
 @router.post("/login")
 async def admin_login(email: str = Form(...), password: str = Form(...)):
-    user = User.objects(email=email, role="admin").first()
-    print(user,id)
-    if not user or not verify_password(password, user.hashed_password):
+    user = await users.get(email=email, role="admin")
+    if not user or not await verify_password_async(password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
 
     access_token = create_access_token(user.email)
@@ -63,81 +72,246 @@ async def admin_login(email: str = Form(...), password: str = Form(...)):
     return response
 
 @router.get("/dashboard", response_class=HTMLResponse)
-async def admin_dashboard(request: Request, current_user: User = Depends(get_current_user)):
+async def admin_dashboard(
+    request: Request,
+    before: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    # Get all quizzes created by this admin
-    quizzes = Quiz.objects(creator_email=current_user.email).order_by("-id")
+    # Get this admin's quizzes, a page at a time and without their questions
+    cursor = ObjectId(before) if before and ObjectId.is_valid(before) else None
+    admin_quizzes, next_cursor = await quizzes.list_for_creator(current_user.email, before=cursor, limit=limit)
+    submission_counts, submission_versions = await quiz_stats.counts_for_quizzes(quiz["id"] for quiz in admin_quizzes)
 
-    return templates.TemplateResponse(
+    # Versions only ever go up, so the listing they were read with validates the page
+    etag = page_etag(
+        "dashboard", current_user.email, before, limit, next_cursor,
+        [(quiz["id"], quiz.get("version"), submission_versions.get(quiz["id"])) for quiz in admin_quizzes],
+    )
+    not_modified_response = conditional_response(request, etag)
+    if not_modified_response:
+        return not_modified_response
+
+    response = templates.TemplateResponse(
         "dashboard.html",
         {
             "request": request,
             "user": current_user,
-            "quizzes": quizzes
+            "quizzes": admin_quizzes,
+            "submission_counts": submission_counts,
+            "next_cursor": next_cursor,
+            "is_first_page": cursor is None
         }
     )
+    return add_validators(response, etag)
     
 @router.get("/quiz_details/{quiz_id}", response_class=HTMLResponse)
 async def quiz_details(
     quiz_id: str,
     request: Request,
+    before: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    quiz = Quiz.objects(id=quiz_id).first()
-    if not quiz:
+    markers = await quizzes.get_markers(quiz_id)
+    if not markers:
         raise HTTPException(status_code=404, detail="Quiz not found")
 
-    if quiz.creator_email != current_user.email:
+    if markers.get("creator_email") != current_user.email:
         raise HTTPException(status_code=403, detail="You don't own this quiz")
 
-    # Get all submissions
-    submissions = Submission.objects(quiz_id=quiz.id).order_by("-submitted_at")
+    # A running regrade changes the page without touching the markers until it finishes
+    stats = (await quiz_stats.for_quizzes([markers["_id"]])).get(markers["_id"])
+    job = get_job(markers["_id"])
+    etag = page_etag(
+        "quiz_details", markers["_id"], markers.get("version"), stats and stats.submissions_version,
+        before, limit, job and (job.status, job.done, job.changed),
+    )
+    not_modified_response = conditional_response(request, etag)
+    if not_modified_response:
+        return not_modified_response
+
+    quiz = await quizzes.get(id=markers["_id"])
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
 
-    # Enrich each submission with student info
-    enriched_submissions = []
     total_questions = len(quiz.questions)
     total_points = quiz.total_points
-    for sub in submissions:
-        student = User.objects(email=sub.student_email).first()
-        correct_count = sub.score
-        
-        points_earned = 0
-        if total_questions > 0:
-            points_earned = round((correct_count / total_questions) * quiz.total_points)
-            
+    if stats is not None and stats.count:
+        summary = {
+            "total_students": stats.count,
+            "avg_correct": round(stats.score_sum / stats.count, 1),
+            "avg_points": round(stats.points_sum / stats.count, 1),
+        }
+    else:
+        # Quizzes with submissions from before statistics were tracked
+        summary = await submissions.summary(quiz.id, total_questions, total_points)
+
+    cursor = decode_cursor(before) if before else None
+    rows, next_cursor = await submissions.page_with_students(
+        quiz.id, total_questions, total_points, before=cursor, limit=limit
+    )
+
+    enriched_submissions = []
+    for sub in rows:
         enriched_submissions.append({
-            "name": student.name if student else "Unknown",
-            "school_id": student.school_id if student else "N/A",
-            "email": sub.student_email,
-            "correct_count": sub.score,
-            "total_questions": len(quiz.questions),
-            "points_earned": points_earned,
+            "name": sub.get("name", "Unknown"),
+            "school_id": sub.get("school_id", "N/A"),
+            "email": sub["student_email"],
+            "correct_count": sub["score"],
+            "total_questions": total_questions,
+            "points_earned": sub["points_earned"],
             "total_points": total_points,
-            "submitted_at": sub.submitted_at.strftime('%Y-%m-%d %H:%M')
+            "submitted_at": sub["submitted_at"].strftime('%Y-%m-%d %H:%M')
         })
 
-    total_students = len(enriched_submissions)
-    avg_correct = sum(s["correct_count"] for s in enriched_submissions) / total_students if total_students > 0 else 0
-    avg_points = sum(s["points_earned"] for s in enriched_submissions) / total_students if total_students > 0 else 0
-
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "quiz_details.html",
         {
             "request": request,
             "quiz": quiz,
             "submissions": enriched_submissions,
-            "total_students": total_students,
-            "avg_correct": round(avg_correct, 1),
-            "avg_points": round(avg_points, 1),
+            "total_students": summary["total_students"],
+            "avg_correct": summary["avg_correct"],
+            "avg_points": summary["avg_points"],
+            "next_cursor": next_cursor,
+            "regrade": job,
+            "is_first_page": cursor is None,
             "total_questions": total_questions,
             "total_points": quiz.total_points
         }
     )
+    return add_validators(response, etag)
+
+# Server-sent events for an open quiz_details page: one event per new submission with running totals
+@router.get("/quiz_details/{quiz_id}/live")
+async def quiz_live_feed(quiz_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    quiz = await quiz_cache.get_compiled_quiz(quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    if not await quizzes.exists(id=quiz.id, creator_email=current_user.email):
+        raise HTTPException(status_code=403, detail="You don't own this quiz")
+
+    queue = await live_feed.subscribe(quiz)
+
+    async def events():
+        try:
+            yield f"retry: 5000\n{format_event('snapshot', live_feed.snapshot(quiz.id))}"
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), Config.LIVE_FEED_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            live_feed.unsubscribe(quiz.id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def export_rows(quiz):
+    total_questions = len(quiz.questions)
+    async for sub, student in submissions.iter_with_students(quiz.id, batch_size=Config.EXPORT_BATCH_SIZE):
+        yield {
+            "name": student.get("name", "Unknown") if student else "Unknown",
+            "school_id": student.get("school_id", "N/A") if student else "N/A",
+            "email": sub["student_email"],
+            "correct_count": sub.get("score", 0),
+            "total_questions": total_questions,
+            "points_earned": points_for(sub.get("score", 0), total_questions, quiz.total_points),
+            "total_points": quiz.total_points,
+            "submitted_at": sub["submitted_at"].isoformat() if sub.get("submitted_at") else "",
+            "answers": sub.get("answers", []),
+        }
+
+async def stream_csv(quiz, chunk_rows=500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    question_columns = [f"q{i + 1}" for i in range(len(quiz.questions))]
+    writer.writerow(["name", "school_id", "email", "correct_count", "total_questions",
+                     "points_earned", "total_points", "submitted_at"] + question_columns)
+    pending = 0
+    async for row in export_rows(quiz):
+        answers = row.pop("answers")
+        writer.writerow(list(row.values()) + answers)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+async def stream_ndjson(quiz, chunk_rows=500):
+    lines = []
+    async for row in export_rows(quiz):
+        lines.append(json.dumps(row))
+        if len(lines) >= chunk_rows:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+@router.get("/quiz_details/{quiz_id}/export")
+async def export_quiz_results(
+    quiz_id: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    quiz = await quizzes.get(id=quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    if quiz.creator_email != current_user.email:
+        raise HTTPException(status_code=403, detail="You don't own this quiz")
+
+    if format == "ndjson":
+        body, media_type = stream_ndjson(quiz), "application/x-ndjson"
+    else:
+        body, media_type = stream_csv(quiz), "text/csv"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{quiz.code}-results.{format}"'}
+    )
+
+@router.get("/quiz_details/{quiz_id}/analysis", response_class=HTMLResponse)
+async def quiz_analysis(quiz_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    quiz = await quizzes.get(id=quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    if quiz.creator_email != current_user.email:
+        raise HTTPException(status_code=403, detail="You don't own this quiz")
+
+    analysis = await get_item_analysis(quiz)
+
+    return templates.TemplateResponse(
+        "quiz_analysis.html",
+        {
+            "request": request,
+            "quiz": quiz,
+            "students": analysis["students"],
+            "items": analysis["items"]
+        }
+    )
 
 @router.get("/create_quiz", response_class=HTMLResponse)
 async def create_quiz_page(request: Request, current_user: User = Depends(get_current_user)):
@@ -157,18 +331,30 @@ async def create_quiz(
     if duration_minutes <= 0:
         raise HTTPException(status_code=400, detail="Duration must be positive")
     code = str(uuid.uuid4())[:8].upper()
-    quiz = Quiz(title=title, duration_minutes=duration_minutes, total_points=total_points, code=code, creator_email=current_user.email)
-    quiz.save()
+    quiz = Quiz(
+        title=title, duration_minutes=duration_minutes, total_points=total_points, code=code,
+        creator_email=current_user.email, modified_at=datetime.utcnow(),
+    )
+    await quizzes.insert(quiz)
     return RedirectResponse(url=f"/admin/add_questions/{quiz.id}", status_code=303)
 
 @router.get("/add_questions/{quiz_id}", response_class=HTMLResponse)
 async def add_questions_page(quiz_id: str, request: Request, current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
-    quiz = Quiz.objects(id=quiz_id).first()
+    markers = await quizzes.get_markers(quiz_id)
+    if not markers:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    etag = page_etag("add_questions", markers["_id"], markers.get("version"))
+    not_modified_response = conditional_response(request, etag, markers.get("modified_at"))
+    if not_modified_response:
+        return not_modified_response
+
+    quiz = await quizzes.get(id=markers["_id"])
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
-    return templates.TemplateResponse("add_question.html", {"request": request, "quiz_id": quiz_id, "questions": quiz.questions})
+    response = templates.TemplateResponse("add_question.html", {"request": request, "quiz_id": quiz_id, "questions": quiz.questions})
+    return add_validators(response, etag, markers.get("modified_at"))
 
 @router.post("/add_questions/{quiz_id}")
 async def add_question(
@@ -180,14 +366,36 @@ async def add_question(
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
-    quiz = Quiz.objects(id=quiz_id).first()
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz not found")
     if len(options) < 2 or correct_option < 0 or correct_option >= len(options):
         raise HTTPException(400, "Invalid options or correct index")
     question = QuestionEmbedded(text=text, options=options, correct_option=correct_option)
-    quiz.questions.append(question)
-    quiz.save()
+    if not await quizzes.push_questions(quiz_id, [question]):
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    quiz_cache.invalidate(quiz_id)
+    return RedirectResponse(url=f"/admin/add_questions/{quiz_id}", status_code=303)
+
+@router.post("/import_questions/{quiz_id}")
+async def import_questions(
+    quiz_id: str,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if not await quizzes.exists(id=quiz_id):
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    questions, errors = parse_question_file(file.filename or "", file.file)
+    if errors:
+        shown = "; ".join(errors[:10])
+        more = f" (and {len(errors) - 10} more)" if len(errors) > 10 else ""
+        raise HTTPException(status_code=400, detail=f"Import failed: {shown}{more}")
+    if not questions:
+        raise HTTPException(status_code=400, detail="Import file contains no questions")
+
+    if not await quizzes.push_questions(quiz_id, questions):
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    quiz_cache.invalidate(quiz_id)
     return RedirectResponse(url=f"/admin/add_questions/{quiz_id}", status_code=303)
 
 @router.post("/edit_question/{quiz_id}/{index}")
@@ -201,15 +409,16 @@ async def edit_question(
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403)
+    if len(options) < 2 or correct_option < 0 or correct_option >= len(options):
+        raise HTTPException(400, "Invalid options or correct index")
 
-    quiz = Quiz.objects(id=quiz_id).first()
-    if not quiz or index >= len(quiz.questions):
+    question = QuestionEmbedded(text=text, options=options, correct_option=correct_option)
+    previous = await quizzes.set_question(quiz_id, index, question)
+    if previous is None:
         raise HTTPException(status_code=404)
-
-    quiz.questions[index].text = text
-    quiz.questions[index].options = options
-    quiz.questions[index].correct_option = correct_option
-    quiz.save()
+    quiz_cache.invalidate(quiz_id)
+    if Config.REGRADE_ON_EDIT and previous.correct_option != correct_option:
+        schedule_regrade(ObjectId(quiz_id))
 
     return RedirectResponse(
         url=f"/admin/add_questions/{quiz_id}",
@@ -225,23 +434,97 @@ async def delete_question(
     if current_user.role != "admin":
         raise HTTPException(status_code=403)
 
-    quiz = Quiz.objects(id=quiz_id).first()
-    if not quiz or index >= len(quiz.questions):
+    version = await quizzes.remove_question(quiz_id, index)
+    if version is None:
         raise HTTPException(status_code=404)
-
-    quiz.questions.pop(index)
-    quiz.save()
+    quiz_cache.invalidate(quiz_id)
+    await submissions.drop_answer(ObjectId(quiz_id), index, version)
+    await autosave_buffer.drop_answer(ObjectId(quiz_id), index)
+    if Config.REGRADE_ON_EDIT:
+        schedule_regrade(ObjectId(quiz_id))
 
     return RedirectResponse(
         url=f"/admin/add_questions/{quiz_id}",
         status_code=303
     )
 
+@router.post("/regrade/{quiz_id}")
+async def regrade(quiz_id: str, current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    quiz = await quizzes.get(id=quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    if quiz.creator_email != current_user.email:
+        raise HTTPException(status_code=403, detail="You don't own this quiz")
+    schedule_regrade(quiz.id)
+    return RedirectResponse(url=f"/admin/quiz_details/{quiz_id}", status_code=303)
+
+@router.get("/regrade/{quiz_id}")
+async def regrade_status(quiz_id: str, current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    quiz = await quizzes.get(id=quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    if quiz.creator_email != current_user.email:
+        raise HTTPException(status_code=403, detail="You don't own this quiz")
+    job = get_job(quiz.id)
+    return JSONResponse(job.as_dict() if job else {"quiz_id": quiz_id, "status": "idle"})
+
+@router.get("/roster", response_class=HTMLResponse)
+async def roster_page(request: Request, job: Optional[str] = Query(None), current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    current = roster.get_job(job) if job else roster.latest_job(current_user.email)
+    if current is not None and current.created_by != current_user.email:
+        current = None
+    return templates.TemplateResponse("roster.html", {"request": request, "job": current})
+
+@router.post("/roster")
+async def import_roster(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if not (file.filename or "").lower().endswith(".csv"):
+        raise HTTPException(status_code=400, detail="Roster must be a .csv file")
+
+    rows, errors = roster.parse_roster(file.file)
+    if not rows and not errors:
+        raise HTTPException(status_code=400, detail="Roster file contains no students")
+    job = roster.start_import(current_user.email, file.filename, rows, errors)
+    return RedirectResponse(url=f"/admin/roster?job={job.id}", status_code=303)
+
+@router.get("/roster/{job_id}")
+async def roster_status(job_id: str, current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    job = roster.get_job(job_id)
+    if job is None or job.created_by != current_user.email:
+        raise HTTPException(status_code=404, detail="Roster import not found")
+    return JSONResponse(job.as_dict())
+
+@router.get("/roster/{job_id}/credentials.csv")
+async def roster_credentials(job_id: str, current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    job = roster.get_job(job_id)
+    if job is None or job.created_by != current_user.email:
+        raise HTTPException(status_code=404, detail="Roster import not found")
+    if job.credentials_downloaded:
+        raise HTTPException(status_code=410, detail="Credentials were already downloaded")
+    if job.status != "finished":
+        raise HTTPException(status_code=409, detail="Roster import has not finished")
+    return PlainTextResponse(
+        roster.take_credentials_csv(job),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="credentials-{job.id[:8]}.csv"', "Cache-Control": "no-store"},
+    )
+
 @router.post("/finish_quiz/{quiz_id}")
 async def finish_quiz(quiz_id: str, current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
-    quiz = Quiz.objects(id=quiz_id).first()
+    quiz = await quizzes.get(id=quiz_id)
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     return RedirectResponse(url=f"/admin/quiz_code/{quiz_id}", status_code=303)
@@ -250,7 +533,7 @@ async def finish_quiz(quiz_id: str, current_user: User = Depends(get_current_use
 async def show_quiz_code(quiz_id: str, request: Request, current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
-    quiz = Quiz.objects(id=quiz_id).first()
+    quiz = await quizzes.get(id=quiz_id)
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     return templates.TemplateResponse("quiz_code.html", {"request": request, "code": quiz.code})
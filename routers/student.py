@@ -1,13 +1,21 @@
 from fastapi import APIRouter, Depends, Request, Form, HTTPException
 from fastapi.params import Query
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from models import StudentCreate, Quiz, Submission, SubmissionCreate, User
-from auth import get_password_hash, create_access_token, get_current_user, verify_password
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response
+from models import StudentCreate, Submission, SubmissionCreate, User
+from auth import get_password_hash_async, create_access_token, get_current_user, invalidate_user, verify_password_async
+from repository import users, quizzes, submissions, quiz_stats
+from quiz_cache import get_compiled_quiz, get_quiz_id_by_code
+from write_behind import submission_writer
+from autosave import autosave_buffer
+from live import live_feed
+from quiz_pages import take_quiz_response
+from http_cache import REVALIDATE, add_validators, conditional_response, etag_matches, make_etag, not_modified, page_etag
+from config import Config
+from templating import templates
 from datetime import datetime
+import json
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 @router.get("/signup", response_class=HTMLResponse)
 async def student_signup_page(request: Request):
@@ -20,11 +28,12 @@ async def student_signup(
     email: str = Form(...),
     password: str = Form(...)
 ):
-    if User.objects(email=email).first():
+    if await users.exists(email=email):
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash_async(password)
     user = User(school_id=school_id, name=name, email=email, hashed_password=hashed_password, role="student")
-    user.save()
+    await users.insert(user)
+    invalidate_user(user.email)
     return RedirectResponse(url="/student/login", status_code=303)
 
 @router.get("/login", response_class=HTMLResponse)
@@ -33,8 +42,8 @@ async def student_login_page(request: Request):
 
 @router.post("/login")
 async def student_login(email: str = Form(...), password: str = Form(...)):
-    user = User.objects(email=email, role="student").first()
-    if not user or not verify_password(password, user.hashed_password):
+    user = await users.get(email=email, role="student")
+    if not user or not await verify_password_async(password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     access_token = create_access_token(user.email)
     response = RedirectResponse(url="/student/enter_code", status_code=303)
@@ -56,14 +65,14 @@ async def enter_code(
     if current_user.role != "student":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    quiz = Quiz.objects(code=code).first()
-    if not quiz:
+    quiz_id = await get_quiz_id_by_code(code)
+    if not quiz_id:
         raise HTTPException(status_code=404, detail="Invalid quiz code")
 
-    already_taken = Submission.objects(
+    already_taken = await submissions.exists(
         student_email=current_user.email,
-        quiz_id=quiz.id
-    ).first() is not None
+        quiz_id=quiz_id
+    )
 
     if already_taken:
         return templates.TemplateResponse(
@@ -76,7 +85,7 @@ async def enter_code(
         )
 
     return RedirectResponse(
-        url=f"/student/take_quiz/{quiz.id}",
+        url=f"/student/take_quiz/{quiz_id}",
         status_code=303
     )
 
@@ -85,31 +94,110 @@ async def take_quiz_page(quiz_id: str, request: Request, current_user: User = De
     if current_user.role != "student":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    quiz = Quiz.objects(id=quiz_id).first()
+    markers = await quizzes.get_markers(quiz_id)
+    if not markers:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    version = markers.get("version", 0)
+    etag = page_etag("take_quiz", markers["_id"], version)
+    not_modified_response = conditional_response(request, etag, markers.get("modified_at"))
+    if not_modified_response:
+        return not_modified_response
+
+    quiz = await get_compiled_quiz(markers["_id"], version=version)
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
-    # Prepare data with indices
-    quiz_dict = quiz.to_mongo().to_dict()
-    for q in quiz_dict['questions']:
-        q['numbered_options'] = list(enumerate(q['options']))
-    
-    already_submitted = Submission.objects(
-        student_email=current_user.email,
-        quiz_id=quiz.id
-    ).first() is not None
+    return add_validators(take_quiz_response(templates, request, quiz), etag, markers.get("modified_at"))
 
-    if already_submitted:
-        return RedirectResponse(
-            url=f"/student/already_taken?quiz_title={quiz.title}",
-            status_code=303
-        )
-        
-    return templates.TemplateResponse(
-        "take_quiz.html",
-        {"request": request, "quiz": quiz_dict, "duration": quiz.duration_minutes}
+# JSON question delivery for large quizzes: pages are slices of per-question JSON cached with the quiz
+@router.get("/quiz/{quiz_id}/questions")
+async def quiz_questions(
+    quiz_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(Config.QUESTION_PAGE_SIZE, ge=1, le=Config.QUESTION_PAGE_MAX),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "student":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    quiz = await get_compiled_quiz(quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    etag = make_etag(quiz.id, quiz.version, offset, limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    total = len(quiz.questions)
+    end = min(offset + limit, total)
+    head = json.dumps({
+        "quiz_id": str(quiz.id),
+        "version": quiz.version,
+        "total": total,
+        "offset": offset,
+        "next": end if end < total else None,
+    })
+    body = head[:-1].encode("utf-8") + b',"questions":' + quiz.questions_json(offset, limit) + b"}"
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+@router.get("/quiz/{quiz_id}/questions/{number}")
+async def quiz_question(quiz_id: str, number: int, request: Request, current_user: User = Depends(get_current_user)):
+    if current_user.role != "student":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    quiz = await get_compiled_quiz(quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    if not 1 <= number <= len(quiz.questions):
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    etag = make_etag(quiz.id, quiz.version, "q", number)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return Response(
+        quiz.questions[number - 1].payload,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": REVALIDATE},
     )
-    
+
+@router.get("/autosave/{quiz_id}")
+async def autosaved_answers(quiz_id: str, current_user: User = Depends(get_current_user)):
+    if current_user.role != "student":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    quiz = await get_compiled_quiz(quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    draft = await autosave_buffer.answers_for(quiz.id, current_user.email)
+    return {"answers": {str(index + 1): option for index, option in draft.items()}}
+
+@router.post("/autosave/{quiz_id}")
+async def autosave(quiz_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    if current_user.role != "student":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    quiz = await get_compiled_quiz(quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    # Body: {"answers": {"<question number>": <option index>, ...}} with only the changed answers
+    try:
+        payload = await request.json()
+        changes = {}
+        for number, option in payload["answers"].items():
+            index, option = int(number) - 1, int(option)
+            if not 0 <= index < len(quiz.questions) or not 0 <= option < len(quiz.questions[index].options):
+                raise ValueError(number)
+            changes[index] = option
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid autosave payload")
+
+    if changes:
+        await autosave_buffer.record(quiz.id, current_user.email, changes)
+    return JSONResponse({"saved": len(changes)}, status_code=202)
+
 @router.get("/already_taken", response_class=HTMLResponse)
 def already_taken_page(
     request: Request,
@@ -129,33 +217,47 @@ async def submit_quiz(quiz_id: str, request: Request, current_user: User = Depen
     if current_user.role != "student":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    quiz = Quiz.objects(id=quiz_id).first()
+    quiz = await get_compiled_quiz(quiz_id)
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
 
     form = await request.form()
     answers = []
-    for i in range(len(quiz.questions)):
+    for i, question in enumerate(quiz.questions):
         ans_key = f"q{i+1}"
         try:
-            answers.append(int(form.get(ans_key, -1)))
+            answer = int(form.get(ans_key, -1))
         except ValueError:
-            answers.append(-1)
+            answer = -1
+        # Same check as autosave: anything that is not one of the options is unanswered
+        answers.append(answer if 0 <= answer < len(question.options) else -1)
+
+    # Anything the final form lacks (lost connection, unloaded questions) comes from the autosaved draft
+    if -1 in answers:
+        draft = await autosave_buffer.answers_for(quiz.id, current_user.email)
+        answers = [draft.get(i, -1) if given == -1 else given for i, given in enumerate(answers)]
 
-    score = 0
-    for idx, q in enumerate(quiz.questions):
-        if idx < len(answers) and answers[idx] == q.correct_option:
-            score += 1
+    score = quiz.score(answers)
     
-    # Save the submission
+    # Save the submission; a repeat of the same answers (double click) is answered like the first
     submission = Submission(
         student_email=current_user.email,
         quiz_id=quiz.id,
         answers=answers,
         score=score,
-        submitted_at=datetime.utcnow()
+        submitted_at=datetime.utcnow(),
+        quiz_version=quiz.version,
     )
-    submission.save()
+    stats_inc = quiz_stats.increments(quiz.answer_key, quiz.total_points, answers, score)
+    stored, created = await submission_writer.save(submission, stats_inc)
+    await autosave_buffer.discard(quiz.id, current_user.email)
+    if created and Config.LIVE_FEED_SOURCE == "local":
+        live_feed.publish(quiz, stored, current_user.name, current_user.school_id)
+    if not created and stored.answers != answers:
+        return RedirectResponse(
+            url=f"/student/already_taken?quiz_title={quiz.title}",
+            status_code=303
+        )
 
     return RedirectResponse(
         url="/student/thank_you",
@@ -0,0 +1,158 @@
+// Per-page values come from data attributes on <body>; the file itself is shared and cached
+const quizPage = document.body.dataset;
+let duration = Number(quizPage.duration) * 60; // seconds
+const timerElement = document.getElementById('timer');
+const submitBtn = document.getElementById('submitBtn');
+const quizForm = document.getElementById('quizForm');
+
+function updateTimer() {
+    let minutes = Math.floor(duration / 60);
+    let seconds = duration % 60;
+    timerElement.textContent = `${minutes}:${seconds < 10 ? '0' + seconds : seconds}`;
+
+    if (duration <= 0) {
+        submitQuiz(true); // Auto-submit on time up
+        return;
+    }
+
+    duration--;
+    setTimeout(updateTimer, 1000);
+}
+
+async function submitQuiz(isAuto = false) {
+    if (submitBtn.disabled) return;
+
+    submitBtn.disabled = true;
+    submitBtn.textContent = isAuto ? "Time up – Submitting..." : "Submitting...";
+
+    const formData = new FormData(quizForm);
+
+    try {
+        const response = await fetch(`/student/submit_quiz/${quizPage.quizId}`, {
+            method: 'POST',
+            body: formData
+        });
+
+        if (response.redirected) {
+            window.location.href = response.url;
+        } else {
+            throw new Error(`Unexpected response: ${response.status}`);
+        }
+    } catch (err) {
+        alert('Error submitting assessment: ' + err.message);
+        submitBtn.disabled = false;
+        submitBtn.textContent = "Submit Assessment";
+    }
+}
+
+// Autosave: changed answers are sent every few seconds and restored after a reload
+const autosaveUrl = `/student/autosave/${quizPage.quizId}`;
+let unsavedAnswers = {};
+let savedAnswers = {};
+
+quizForm.addEventListener('change', (event) => {
+    if (event.target.type === 'radio') {
+        unsavedAnswers[event.target.name.slice(1)] = Number(event.target.value);
+    }
+});
+
+async function autosave() {
+    if (submitBtn.disabled || Object.keys(unsavedAnswers).length === 0) return;
+    const batch = unsavedAnswers;
+    unsavedAnswers = {};
+    try {
+        const response = await fetch(autosaveUrl, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({answers: batch})
+        });
+        if (!response.ok) throw new Error(`Unexpected response: ${response.status}`);
+    } catch (err) {
+        unsavedAnswers = {...batch, ...unsavedAnswers};
+    }
+}
+
+function restoreAnswers(root) {
+    for (const [number, option] of Object.entries(savedAnswers)) {
+        const input = root.querySelector(`input[name="q${number}"][value="${option}"]`);
+        if (input && !quizForm.querySelector(`input[name="q${number}"]:checked`)) input.checked = true;
+    }
+}
+
+fetch(autosaveUrl)
+    .then((response) => (response.ok ? response.json() : {answers: {}}))
+    .then((draft) => { savedAnswers = draft.answers; restoreAnswers(quizForm); })
+    .catch(() => {});
+
+setInterval(autosave, Number(quizPage.autosaveInterval) * 1000);
+window.addEventListener('pagehide', () => {
+    if (submitBtn.disabled || Object.keys(unsavedAnswers).length === 0) return;
+    const body = new Blob([JSON.stringify({answers: unsavedAnswers})], {type: 'application/json'});
+    navigator.sendBeacon(autosaveUrl, body);
+});
+
+// Large quizzes: fetch further questions as the student scrolls towards the end
+const quizMore = document.getElementById('quizMore');
+let loadingMore = false;
+
+function renderQuestion(q) {
+    const card = document.createElement('div');
+    card.className = 'assessment-card';
+    const number = document.createElement('span');
+    number.className = 'question-number';
+    number.textContent = `Question ${q.number}`;
+    const text = document.createElement('p');
+    text.className = 'lead mb-3';
+    text.textContent = q.text;
+    card.append(number, text);
+    q.options.forEach((option, index) => {
+        const label = document.createElement('label');
+        label.className = 'option-label';
+        const input = document.createElement('input');
+        input.type = 'radio';
+        input.name = `q${q.number}`;
+        input.value = index;
+        input.className = 'me-3';
+        input.required = true;
+        label.append(input, document.createTextNode(option));
+        card.append(label);
+    });
+    quizMore.before(card);
+    restoreAnswers(card);
+}
+
+async function loadMoreQuestions() {
+    if (loadingMore || !quizMore || quizMore.dataset.next === '') return;
+    loadingMore = true;
+    try {
+        const params = new URLSearchParams({offset: quizMore.dataset.next, limit: quizMore.dataset.limit});
+        const response = await fetch(`/student/quiz/${quizPage.quizId}/questions?${params}`);
+        if (!response.ok) throw new Error(`Unexpected response: ${response.status}`);
+        const page = await response.json();
+        page.questions.forEach(renderQuestion);
+        quizMore.textContent = 'Loading more questions…';
+        if (page.next === null) {
+            quizMore.dataset.next = '';
+            quizMore.remove();
+        } else {
+            quizMore.dataset.next = page.next;
+        }
+    } catch (err) {
+        quizMore.textContent = 'Could not load more questions, retrying…';
+        setTimeout(() => { loadingMore = false; loadMoreQuestions(); }, 3000);
+        return;
+    }
+    loadingMore = false;
+    if (quizMore.isConnected && quizMore.getBoundingClientRect().top < window.innerHeight * 2) {
+        loadMoreQuestions();
+    }
+}
+
+if (quizMore) {
+    new IntersectionObserver((entries) => {
+        if (entries.some((entry) => entry.isIntersecting)) loadMoreQuestions();
+    }, {rootMargin: '800px 0px'}).observe(quizMore);
+}
+
+// Start timer
+updateTimer();
@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz copies are built
+    brotli = None
+
+SOURCE_DIR = "static"
+BUILD_DIR = os.path.join(SOURCE_DIR, "build")
+MANIFEST = os.path.join(BUILD_DIR, "manifest.json")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".html", ".map")
+MIN_COMPRESS_SIZE = 256
+# Preferred first when the client accepts several
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+def _compressed(data):
+    yield ".gz", gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", brotli.compress(data, quality=11)
+
+def build(source=SOURCE_DIR, output=BUILD_DIR):
+    # Copies every asset to <name>.<content hash><ext> plus .gz/.br siblings and writes
+    # manifest.json (source name -> built name). Run on deploy: manage.py build-static
+    shutil.rmtree(output, ignore_errors=True)
+    manifest = {}
+    sizes = {}
+    for root, dirs, files in os.walk(source):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != output)
+        for name in sorted(files):
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            logical = os.path.relpath(path, source).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                data = f.read()
+            stem, ext = os.path.splitext(logical)
+            built = f"{stem}.{hashlib.blake2b(data, digest_size=8).hexdigest()}{ext}"
+            target = os.path.join(output, built)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+            sizes[logical] = {"identity": len(data)}
+            if ext in COMPRESSIBLE and len(data) >= MIN_COMPRESS_SIZE:
+                for suffix, compressed in _compressed(data):
+                    if len(compressed) < len(data):
+                        with open(target + suffix, "wb") as f:
+                            f.write(compressed)
+                        sizes[logical][suffix[1:]] = len(compressed)
+            manifest[logical] = built
+    os.makedirs(output, exist_ok=True)
+    with open(os.path.join(output, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest, sizes
+
+def load_manifest(path=MANIFEST):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+manifest = load_manifest()
+fingerprinted = set(manifest.values())
+
+def static_url(name):
+    # Without a build (development) the source file is served and revalidated on every use
+    built = manifest.get(name)
+    return f"/static/build/{built}" if built else f"/static/{name}"
+
+def accepted_encodings(header):
+    # Codings an Accept-Encoding header allows: q=0 refuses one, "*" stands for the others
+    weights = {}
+    for part in header.split(","):
+        name, *params = [piece.strip() for piece in part.split(";")]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        name = name.lower()
+        if name:
+            weights["gzip" if name == "x-gzip" else name] = q
+    wildcard = weights.pop("*", 0)
+    return {name for name, _ in ENCODINGS if weights.get(name, wildcard) > 0} | {name for name, q in weights.items() if q > 0}
+
+def _accepted_encodings(scope):
+    return accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+
+# Fingerprinted files listed in the manifest never change: they are cached for a year, carry a
+# content-hash ETag and are served from the .br/.gz sibling the client accepts.
+# Anything else (unbuilt sources) is sent with no-cache and revalidated.
+class StaticAssets(StaticFiles):
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        full_path = str(full_path)
+        built = os.path.relpath(os.path.realpath(full_path), os.path.realpath(BUILD_DIR)).replace(os.sep, "/")
+        if built not in fingerprinted:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        # name.<hash>.ext -> the hash is a validator shared by every server
+        fingerprint = built.rsplit(".", 2)[-2]
+        headers = {"Cache-Control": IMMUTABLE, "Vary": "Accept-Encoding"}
+        encoding = "identity"
+        accepted = _accepted_encodings(scope)
+        for name, suffix in ENCODINGS:
+            if name in accepted and os.path.isfile(full_path + suffix):
+                full_path += suffix
+                stat_result = os.stat(full_path)
+                headers["Content-Encoding"] = encoding = name
+                break
+        headers["ETag"] = f'"{fingerprint}-{encoding}"'
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,6 @@
+from fastapi.templating import Jinja2Templates
+from static_assets import static_url
+
+# One Jinja environment (and template cache) shared by the app and both routers
+templates = Jinja2Templates(directory="templates")
+templates.env.globals["static_url"] = static_url
@@ -0,0 +1,69 @@
+import os
+import sys
+import uuid
+import pytest
+
+# Modules read templates/ and static/ relative to the working directory, as under uvicorn
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from pymongo import AsyncMongoClient, MongoClient, monitoring
+from pymongo.errors import PyMongoError
+import database
+from instrumentation import command_metrics
+
+# Database tests run against a real mongod and are skipped when there is none
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "mongodb://127.0.0.1:27017")
+
+# Keeps every command sent while commands is a list, for tests that inspect them
+class CommandRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = None
+
+    def started(self, event):
+        if self.commands is not None:
+            self.commands.append((event.command_name, dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+command_recorder = CommandRecorder()
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture(scope="session")
+def mongo_url():
+    probe = MongoClient(TEST_DATABASE_URL, serverSelectionTimeoutMS=500)
+    try:
+        probe.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"no MongoDB reachable at {TEST_DATABASE_URL}")
+    finally:
+        probe.close()
+    return TEST_DATABASE_URL
+
+@pytest.fixture
+async def db(mongo_url):
+    # A throwaway database with the application's indexes, dropped afterwards
+    name = f"quiz_test_{uuid.uuid4().hex[:12]}"
+    client = AsyncMongoClient(mongo_url, event_listeners=[command_metrics, command_recorder])
+    database.client, database.db = client, client[name]
+    try:
+        await database.ensure_indexes()
+        yield database.db
+    finally:
+        await client.drop_database(name)
+        await client.close()
+        database.client = database.db = None
+
+@pytest.fixture
+def recorded_commands():
+    command_recorder.commands = []
+    yield command_recorder.commands
+    command_recorder.commands = None
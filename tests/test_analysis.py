@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from bson import ObjectId
+import analysis
+from analysis import get_item_analysis, item_analysis
+from models import QuestionEmbedded, Quiz
+from regrade import answer_matrix
+
+def test_answer_matrix_from_complete_answers():
+    matrix = answer_matrix([{"answers": [0, 1]}, {"answers": [2, 3]}], 2)
+    assert matrix.dtype == np.int32
+    assert matrix.tolist() == [[0, 1], [2, 3]]
+
+def test_answer_matrix_pads_and_truncates():
+    batch = [{"answers": [1]}, {}, {"answers": None}, {"answers": [0, 1, 2, 3]}]
+    assert answer_matrix(batch, 3).tolist() == [[1, -1, -1], [-1, -1, -1], [-1, -1, -1], [0, 1, 2]]
+
+def test_answer_matrix_blanks_out_of_range_choices():
+    batch = [{"answers": [0, 2**40]}, {"answers": [-5, 1]}]
+    assert answer_matrix(batch, 2).tolist() == [[0, -1], [-1, 1]]
+    # The padding path checks them too
+    assert answer_matrix([{"answers": [2**70]}, {"answers": [1, 2**40, 0]}], 2).tolist() == [[-1, -1], [1, -1]]
+
+def test_answer_matrix_of_empty_batch():
+    assert answer_matrix([], 4).shape == (0, 4)
+
+def test_item_analysis():
+    matrix = np.array([
+        [0, 1, -1],
+        [0, 0, 2],
+        [1, 1, 2],
+        [0, 1, 5],
+    ], dtype=np.int32)
+    p_values, discrimination, histogram = item_analysis(matrix, [0, 1, 2], [2, 2, 3])
+    assert p_values.tolist() == [0.75, 0.75, 0.5]
+    # Column 0 counts unanswered and out-of-range choices, then one column per option
+    assert histogram.tolist() == [[0, 3, 1, 0], [0, 1, 3, 0], [2, 0, 0, 2]]
+    # Every item here is answered correctly by exactly the students who miss the rest
+    assert np.allclose(discrimination, [-1, -1, -1])
+
+def test_item_answered_by_stronger_students_discriminates_positively():
+    matrix = np.array([[0, 0, 0], [0, 0, 1], [0, 1, 1], [1, 1, 1]], dtype=np.int32)
+    _, discrimination, _ = item_analysis(matrix, [0, 0, 0], [2, 2, 2])
+    assert np.all(discrimination > 0)
+
+def test_item_everyone_answers_alike_has_no_discrimination():
+    matrix = np.array([[0, 0], [0, 1], [0, 0]], dtype=np.int32)
+    _, discrimination, _ = item_analysis(matrix, [0, 0], [2, 2])
+    assert discrimination[0] == 0
+
+def test_item_analysis_without_students():
+    p_values, discrimination, histogram = item_analysis(np.empty((0, 2), dtype=np.int32), [0, 1], [2, 3])
+    assert p_values.tolist() == [0, 0]
+    assert discrimination.tolist() == [0, 0]
+    assert histogram.shape == (2, 4)
+    assert histogram.sum() == 0
+
+class FakeStats:
+    async def for_quizzes(self, quiz_ids):
+        return {}
+
+class FakeSubmissions:
+    def __init__(self, answers):
+        self.answers = answers
+
+    async def count_for_quiz(self, quiz_id):
+        return len(self.answers)
+
+    async def iter_answer_batches(self, quiz_id, batch_size=5000):
+        yield [{"answers": given} for given in self.answers]
+
+@pytest.mark.anyio
+async def test_item_analysis_of_stored_out_of_range_answers(monkeypatch):
+    # Stored before submit_quiz range-checked answers: counted as unanswered, not a 500
+    monkeypatch.setattr(analysis, "quiz_stats", FakeStats())
+    monkeypatch.setattr(analysis, "submissions", FakeSubmissions([[0, 2**40], [-3, 1], [1, 0]]))
+    quiz = Quiz(id=ObjectId(), version=1, questions=[
+        QuestionEmbedded(text=f"Q{n}", options=["a", "b"], correct_option=n) for n in range(2)
+    ])
+    result = await get_item_analysis(quiz)
+    assert result["students"] == 3
+    assert [item["unanswered"] for item in result["items"]] == [1, 1]
+    assert [[option["count"] for option in item["options"]] for item in result["items"]] == [[1, 1], [1, 1]]
+    assert [item["p_value"] for item in result["items"]] == [0.333, 0.333]
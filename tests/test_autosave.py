@@ -0,0 +1,196 @@
+import asyncio
+import pytest
+from bson import ObjectId
+import autosave
+from autosave import DraftBuffer
+
+pytestmark = pytest.mark.anyio
+
+class FakeDrafts:
+    def __init__(self):
+        self.stored = {}
+        self.upserts = []
+        self.dropped = []
+        self.fail = False
+
+    async def upsert_many(self, changes, updated_at):
+        if self.fail:
+            raise ConnectionError("down")
+        self.upserts.append(len(changes))
+        for key, answers in changes.items():
+            self.stored.setdefault(key, {}).update(answers)
+
+    async def answers_for(self, quiz_id, student_email):
+        return dict(self.stored.get((quiz_id, student_email), {}))
+
+    async def delete_many(self, keys):
+        for key in keys:
+            self.stored.pop(key, None)
+
+    async def drop_answer(self, quiz_id, index):
+        self.dropped.append((quiz_id, index))
+        for (stored_quiz, _), answers in self.stored.items():
+            if stored_quiz == quiz_id:
+                shifted = {i - (i > index): option for i, option in answers.items() if i != index}
+                answers.clear()
+                answers.update(shifted)
+
+@pytest.fixture
+def fake_drafts(monkeypatch):
+    fake = FakeDrafts()
+    monkeypatch.setattr(autosave, "drafts", fake)
+    return fake
+
+async def test_changes_are_coalesced_until_flushed(fake_drafts):
+    quiz_id = ObjectId()
+    buffer = DraftBuffer(flush_interval=60)
+    buffer.start()
+    try:
+        await buffer.record(quiz_id, "s@example.com", {0: 1})
+        await buffer.record(quiz_id, "s@example.com", {0: 2, 1: 0})
+        assert fake_drafts.upserts == []
+        assert await buffer.answers_for(quiz_id, "s@example.com") == {0: 2, 1: 0}
+        await buffer._flush()
+    finally:
+        await buffer.stop()
+    assert fake_drafts.upserts == [1]
+    assert fake_drafts.stored == {(quiz_id, "s@example.com"): {0: 2, 1: 0}}
+
+async def test_pending_changes_win_over_the_stored_draft(fake_drafts):
+    quiz_id = ObjectId()
+    fake_drafts.stored[(quiz_id, "s@example.com")] = {0: 0, 1: 1}
+    buffer = DraftBuffer(flush_interval=60)
+    buffer.start()
+    try:
+        await buffer.record(quiz_id, "s@example.com", {1: 3})
+        assert await buffer.answers_for(quiz_id, "s@example.com") == {0: 0, 1: 3}
+    finally:
+        await buffer.stop()
+
+async def test_flushes_in_batches(fake_drafts):
+    quiz_id = ObjectId()
+    buffer = DraftBuffer(flush_interval=60, batch_size=2)
+    buffer.start()
+    try:
+        for n in range(5):
+            await buffer.record(quiz_id, f"s{n}@example.com", {0: n})
+        await buffer._flush()
+    finally:
+        await buffer.stop()
+    assert fake_drafts.upserts == [2, 2, 1]
+
+async def test_discard_hides_and_deletes_the_draft(fake_drafts):
+    quiz_id = ObjectId()
+    fake_drafts.stored[(quiz_id, "s@example.com")] = {0: 1}
+    buffer = DraftBuffer(flush_interval=60)
+    buffer.start()
+    try:
+        await buffer.record(quiz_id, "s@example.com", {1: 1})
+        await buffer.discard(quiz_id, "s@example.com")
+        assert await buffer.answers_for(quiz_id, "s@example.com") == {}
+        await buffer._flush()
+    finally:
+        await buffer.stop()
+    assert fake_drafts.stored == {}
+
+async def test_failed_flush_keeps_changes_for_the_next_one(fake_drafts):
+    quiz_id = ObjectId()
+    buffer = DraftBuffer(flush_interval=60)
+    buffer.start()
+    try:
+        await buffer.record(quiz_id, "s@example.com", {0: 1})
+        fake_drafts.fail = True
+        await buffer._flush()
+        await buffer.record(quiz_id, "s@example.com", {1: 2})
+        assert await buffer.answers_for(quiz_id, "s@example.com") == {0: 1, 1: 2}
+        fake_drafts.fail = False
+        await buffer._flush()
+    finally:
+        await buffer.stop()
+    assert fake_drafts.stored == {(quiz_id, "s@example.com"): {0: 1, 1: 2}}
+
+async def test_without_start_writes_directly(fake_drafts):
+    quiz_id = ObjectId()
+    buffer = DraftBuffer()
+    await buffer.record(quiz_id, "s@example.com", {0: 1})
+    assert fake_drafts.upserts == [1]
+    await buffer.discard(quiz_id, "s@example.com")
+    assert fake_drafts.stored == {}
+
+async def test_stop_flushes_changes_recorded_before_the_loop_ran(fake_drafts):
+    quiz_id = ObjectId()
+    buffer = DraftBuffer(flush_interval=60)
+    buffer.start()
+    await buffer.record(quiz_id, "s@example.com", {0: 1})
+    await buffer.stop()
+    assert fake_drafts.stored == {(quiz_id, "s@example.com"): {0: 1}}
+
+async def test_changes_being_flushed_stay_visible(fake_drafts, monkeypatch):
+    quiz_id = ObjectId()
+    key = (quiz_id, "s@example.com")
+    fake_drafts.stored[key] = {0: 0}
+    buffer = DraftBuffer(flush_interval=60)
+    release = asyncio.Event()
+    upsert_many = fake_drafts.upsert_many
+
+    async def slow_upsert_many(changes, updated_at):
+        await release.wait()
+        await upsert_many(changes, updated_at)
+    monkeypatch.setattr(fake_drafts, "upsert_many", slow_upsert_many)
+
+    buffer.start()
+    try:
+        await buffer.record(quiz_id, "s@example.com", {1: 2})
+        flush = asyncio.create_task(buffer._flush())
+        await asyncio.sleep(0)
+        assert buffer.pending == {}
+        assert await buffer.answers_for(quiz_id, "s@example.com") == {0: 0, 1: 2}
+        await buffer.discard(quiz_id, "s@example.com")
+        assert await buffer.answers_for(quiz_id, "s@example.com") == {}
+        release.set()
+        await flush
+    finally:
+        release.set()
+        await buffer.stop()
+    assert fake_drafts.stored == {}
+
+async def test_drop_answer_moves_buffered_answers(fake_drafts):
+    quiz_id, other = ObjectId(), ObjectId()
+    buffer = DraftBuffer(flush_interval=60)
+    buffer.start()
+    try:
+        await buffer.record(quiz_id, "s@example.com", {0: 1, 1: 2, 3: 0})
+        await buffer.record(other, "s@example.com", {3: 1})
+        await buffer.drop_answer(quiz_id, 1)
+        assert buffer.pending == {(quiz_id, "s@example.com"): {0: 1, 2: 0}, (other, "s@example.com"): {3: 1}}
+    finally:
+        await buffer.stop()
+    assert fake_drafts.dropped == [(quiz_id, 1)]
+
+async def test_drop_answer_waits_for_the_flush_in_flight(fake_drafts, monkeypatch):
+    quiz_id = ObjectId()
+    buffer = DraftBuffer(flush_interval=60)
+    release = asyncio.Event()
+    upsert_many = fake_drafts.upsert_many
+
+    async def slow_upsert_many(changes, updated_at):
+        await release.wait()
+        await upsert_many(changes, updated_at)
+    monkeypatch.setattr(fake_drafts, "upsert_many", slow_upsert_many)
+
+    buffer.start()
+    try:
+        await buffer.record(quiz_id, "s@example.com", {0: 1, 2: 2})
+        flush = asyncio.create_task(buffer._flush())
+        await asyncio.sleep(0)
+        drop = asyncio.create_task(buffer.drop_answer(quiz_id, 1))
+        await asyncio.sleep(0)
+        assert fake_drafts.dropped == []
+        release.set()
+        await flush
+        await drop
+    finally:
+        release.set()
+        await buffer.stop()
+    # Written at the old positions, then shifted with the stored drafts
+    assert fake_drafts.stored == {(quiz_id, "s@example.com"): {0: 1, 1: 2}}
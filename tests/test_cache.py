@@ -0,0 +1,73 @@
+import time
+from cache import TTLCache
+
+def test_get_returns_default_for_missing_key():
+    cache = TTLCache("test", maxsize=2)
+    assert cache.get("a") is None
+    assert cache.get("a", 1) == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache("test", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = TTLCache("test", ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=1)
+    now[0] += 5
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    now[0] += 6
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_per_entry_ttl_cannot_outlive_cache_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = TTLCache("test", ttl=10)
+    cache.set("a", 1, ttl=60)
+    now[0] += 11
+    assert cache.get("a") is None
+
+def test_weigher_bounds_total_weight():
+    cache = TTLCache("test", maxsize=10, weigher=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.set("c", "xxxx")
+    assert cache.get("a") is None
+    assert cache.weight == 8
+    # Larger than the whole cache: not stored at all
+    cache.set("d", "x" * 11)
+    assert cache.get("d") is None
+    assert cache.weight == 8
+
+def test_replacing_a_key_updates_its_weight():
+    cache = TTLCache("test", maxsize=10, weigher=len)
+    cache.set("a", "xxxx")
+    cache.set("a", "xx")
+    assert cache.weight == 2
+
+def test_pop_and_clear():
+    cache = TTLCache("test", maxsize=10, weigher=len)
+    cache.set("a", "xxx")
+    cache.set("b", "xx")
+    assert cache.pop("a") == "xxx"
+    assert cache.pop("a") is None
+    assert cache.weight == 2
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.weight == 0
+
+def test_zero_maxsize_disables_the_cache():
+    cache = TTLCache("test", maxsize=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
@@ -0,0 +1,33 @@
+from datetime import datetime
+from fastapi import Request
+from http_cache import is_not_modified, make_etag
+
+MODIFIED = datetime(2024, 5, 1, 12, 30, 15, 500000)
+
+def request(**headers):
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+def test_without_validators_the_page_is_sent():
+    assert not is_not_modified(request(), make_etag(1), MODIFIED)
+
+def test_matching_etag():
+    etag = make_etag("quiz", 3)
+    assert is_not_modified(request(if_none_match=etag), etag)
+    # Weak and strong forms compare equal, and any tag in the list may match
+    assert is_not_modified(request(if_none_match=f'"other", {etag.removeprefix("W/")}'), etag)
+    assert is_not_modified(request(if_none_match="*"), etag)
+    assert not is_not_modified(request(if_none_match=make_etag("quiz", 2)), etag)
+
+def test_if_modified_since():
+    assert is_not_modified(request(if_modified_since="Wed, 01 May 2024 12:30:15 GMT"), make_etag(1), MODIFIED)
+    assert is_not_modified(request(if_modified_since="Wed, 01 May 2024 13:00:00 GMT"), make_etag(1), MODIFIED)
+    assert not is_not_modified(request(if_modified_since="Wed, 01 May 2024 12:30:14 GMT"), make_etag(1), MODIFIED)
+    assert not is_not_modified(request(if_modified_since="yesterday"), make_etag(1), MODIFIED)
+    assert not is_not_modified(request(if_modified_since="Wed, 01 May 2024 12:30:15 GMT"), make_etag(1))
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    headers = {"if_none_match": make_etag(2), "if_modified_since": "Wed, 01 May 2024 13:00:00 GMT"}
+    assert not is_not_modified(request(**headers), make_etag(1), MODIFIED)
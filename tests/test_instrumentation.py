@@ -0,0 +1,49 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from instrumentation import route_label
+
+pytestmark = pytest.mark.anyio
+
+async def plain_app(scope, receive, send):
+    await PlainTextResponse("ok")(scope, receive, send)
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/quiz/{quiz_id}")
+    async def quiz(quiz_id: str):
+        return PlainTextResponse(quiz_id)
+
+    app.mount("/static", plain_app)
+    return app
+
+async def label_for(app, path, root_path=""):
+    # Labels are read once the app has routed the request, as the middlewares do
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": root_path,
+        "query_string": b"", "headers": [], "scheme": "http", "server": ("test", 80), "client": ("test", 1),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return route_label(scope), messages[0]["status"]
+
+async def test_route_template():
+    assert await label_for(make_app(), "/quiz/abc") == ("/quiz/{quiz_id}", 200)
+
+async def test_mount_prefix():
+    app = make_app()
+    assert await label_for(app, "/static/css/site.css") == ("/static", 200)
+    assert await label_for(app, "/api/static/css/site.css", root_path="/api") == ("/static", 200)
+
+async def test_unmatched():
+    app = make_app()
+    assert await label_for(app, "/missing") == ("unmatched", 404)
+    assert await label_for(app, "/api/missing", root_path="/api") == ("unmatched", 404)
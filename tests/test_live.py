@@ -0,0 +1,65 @@
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+import live
+from live import LiveFeed
+from models import QuizStats, Submission
+
+pytestmark = pytest.mark.anyio
+
+class FakeStats:
+    def __init__(self):
+        self.stored = {}
+
+    async def for_quizzes(self, quiz_ids):
+        return {quiz_id: self.stored[quiz_id] for quiz_id in quiz_ids if quiz_id in self.stored}
+
+class FakeSubmissions:
+    def __init__(self):
+        self.totals_for = {}
+
+    async def totals(self, quiz_id, total_questions, total_points):
+        return dict(self.totals_for.get(quiz_id, {"count": 0, "score_sum": 0, "points_sum": 0}))
+
+@pytest.fixture
+def repos(monkeypatch):
+    fakes = FakeStats(), FakeSubmissions()
+    monkeypatch.setattr(live, "quiz_stats", fakes[0])
+    monkeypatch.setattr(live, "submissions", fakes[1])
+    return fakes
+
+def make_quiz():
+    return SimpleNamespace(id=ObjectId(), questions=[None] * 4, total_points=40)
+
+def submission(quiz, score):
+    return Submission(quiz_id=quiz.id, student_email="s@example.com", answers=[], score=score, submitted_at=datetime.utcnow())
+
+async def test_seeded_from_statistics_and_kept_up_to_date(repos):
+    quiz = make_quiz()
+    repos[0].stored[quiz.id] = QuizStats(quiz_id=quiz.id, count=2, score_sum=5, points_sum=50)
+    feed = LiveFeed()
+    queue = await feed.subscribe(quiz)
+    feed.publish(quiz, submission(quiz, 4), "Ann")
+    assert feed.snapshot(quiz.id) == {"total_students": 3, "avg_correct": 3.0, "avg_points": 30.0}
+    assert "event: submission" in queue.get_nowait()
+
+async def test_quiz_without_statistics_is_seeded_from_submissions(repos):
+    quiz = make_quiz()
+    repos[1].totals_for[quiz.id] = {"count": 4, "score_sum": 6, "points_sum": 60}
+    feed = LiveFeed()
+    await feed.subscribe(quiz)
+    assert feed.snapshot(quiz.id) == {"total_students": 4, "avg_correct": 1.5, "avg_points": 15.0}
+
+async def test_reseed_after_statistics_change(repos):
+    quiz = make_quiz()
+    repos[0].stored[quiz.id] = QuizStats(quiz_id=quiz.id, count=2, score_sum=2, points_sum=20)
+    feed = LiveFeed()
+    queue = await feed.subscribe(quiz)
+    repos[0].stored[quiz.id] = QuizStats(quiz_id=quiz.id, count=2, score_sum=6, points_sum=60)
+    await feed.reseed(quiz)
+    assert feed.snapshot(quiz.id)["avg_correct"] == 3.0
+    feed.unsubscribe(quiz.id, queue)
+    assert quiz.id not in feed.aggregates
+    await feed.reseed(quiz)
+    assert quiz.id not in feed.aggregates
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+import pytest
+from pool import BoundedPool, PoolBusy
+
+pytestmark = pytest.mark.anyio
+
+async def test_run_returns_the_result_off_the_event_loop():
+    pool = BoundedPool("test", max_workers=1)
+    try:
+        assert await pool.run(threading.get_ident) != threading.get_ident()
+        assert pool.pending == 0
+    finally:
+        pool.shutdown()
+
+async def test_full_pool_rejects_new_work():
+    pool = BoundedPool("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+    try:
+        running = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert pool.pending == 2
+        with pytest.raises(PoolBusy):
+            await pool.run(release.wait)
+        release.set()
+        assert await asyncio.gather(*running) == [True, True]
+        # Capacity is given back once jobs finish
+        assert await pool.run(sum, [1, 2]) == 3
+    finally:
+        release.set()
+        pool.shutdown()
+
+async def test_errors_propagate_and_free_the_slot():
+    pool = BoundedPool("test", max_workers=1)
+    try:
+        with pytest.raises(ZeroDivisionError):
+            await pool.run(divmod, 1, 0)
+        assert pool.pending == 0
+    finally:
+        pool.shutdown()
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        BoundedPool("test", kind="fiber")
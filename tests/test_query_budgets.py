@@ -0,0 +1,196 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from urllib.parse import urlencode
+import pytest
+import regrade
+import roster
+from auth import create_access_token, get_password_hash, hash_pool
+from config import Config
+from instrumentation import route_label
+from main import app
+from manage import _clear_caches, _seed_submissions
+from models import QuestionEmbedded, Quiz, Submission, User
+from query_budget import ROUTE_BUDGETS, QueryBudgetMiddleware
+from repository import quizzes, submissions, users
+
+pytestmark = pytest.mark.anyio
+
+SIZES = (10, 1000)
+
+def form(**fields):
+    return "form", fields
+
+def upload(filename, content):
+    return "file", (filename, content)
+
+def json_body(payload):
+    return "json", payload
+
+# One request per budgeted route, in an order that takes each down its full path:
+# (method, route as in ROUTE_BUDGETS, path when it differs, role, body). Paths and form
+# values are formatted with the run's state. "legacy" is a quiz with submissions but no statistics.
+CASES = [
+    ("POST", "/admin/signup", None, None, form(name="Admin", email="admin{size}@example.com", password="pw", secret_code="{admin_secret}")),
+    ("POST", "/admin/login", None, None, form(email="admin@example.com", password="pw")),
+    ("GET", "/admin/dashboard", None, "admin", None),
+    ("GET", "/admin/quiz_details/{quiz_id}", None, "admin", None),
+    ("GET", "/admin/quiz_details/{quiz_id}", "/admin/quiz_details/{legacy_id}", "admin", None),
+    ("GET", "/admin/quiz_details/{quiz_id}/live", None, "admin", None),
+    ("GET", "/admin/quiz_details/{quiz_id}/live", "/admin/quiz_details/{legacy_id}/live", "admin", None),
+    ("GET", "/admin/create_quiz", None, "admin", None),
+    ("POST", "/admin/create_quiz", None, "admin", form(title="Another", duration_minutes="30")),
+    ("GET", "/admin/add_questions/{quiz_id}", None, "admin", None),
+    ("POST", "/admin/add_questions/{quiz_id}", None, "admin", form(text="Added", options=["a", "b"], correct_option="1")),
+    ("POST", "/admin/import_questions/{quiz_id}", None, "admin", upload("questions.csv", "text,correct_option,option_1,option_2\nImported?,0,a,b\n")),
+    ("POST", "/admin/edit_question/{quiz_id}/{index}", "/admin/edit_question/{quiz_id}/0", "admin", form(text="Edited", options=["a", "b", "c", "d"], correct_option="2")),
+    ("POST", "/admin/delete_question/{quiz_id}/{index}", "/admin/delete_question/{quiz_id}/1", "admin", None),
+    ("POST", "/admin/regrade/{quiz_id}", None, "admin", None),
+    ("GET", "/admin/regrade/{quiz_id}", None, "admin", None),
+    ("GET", "/admin/roster", None, "admin", None),
+    ("POST", "/admin/roster", None, "admin", upload("roster.csv", "school_id,name,email,password\nR{size},Roster,roster{size}@example.com,\n")),
+    ("GET", "/admin/roster/{job_id}", "/admin/roster/{roster_job}", "admin", None),
+    ("GET", "/admin/roster/{job_id}/credentials.csv", "/admin/roster/{roster_job}/credentials.csv", "admin", None),
+    ("POST", "/admin/finish_quiz/{quiz_id}", None, "admin", None),
+    ("GET", "/admin/quiz_code/{quiz_id}", None, "admin", None),
+    ("POST", "/student/signup", None, None, form(school_id="N{size}", name="New", email="new{size}@example.com", password="pw")),
+    ("POST", "/student/login", None, None, form(email="pending{size}@example.com", password="pw")),
+    ("GET", "/student/enter_code", None, "student", None),
+    ("POST", "/student/enter_code", None, "student", form(code="{code}")),
+    ("GET", "/student/take_quiz/{quiz_id}", None, "student", None),
+    ("GET", "/student/quiz/{quiz_id}/questions", None, "student", None),
+    ("GET", "/student/quiz/{quiz_id}/questions/{number}", "/student/quiz/{quiz_id}/questions/1", "student", None),
+    ("GET", "/student/autosave/{quiz_id}", None, "student", None),
+    ("POST", "/student/autosave/{quiz_id}", None, "student", json_body({"answers": {"1": 0}})),
+    ("POST", "/student/submit_quiz/{quiz_id}", None, "student", form(q1="0", q2="1")),
+    ("GET", "/student/already_taken", "/student/already_taken?quiz_title=Budget", "student", None),
+    ("GET", "/student/thank_you", None, "student", None),
+]
+
+def encode(body, state):
+    kind, payload = body
+    if kind == "json":
+        return "application/json", json.dumps(payload).encode()
+    if kind == "file":
+        filename, content = payload
+        boundary = uuid.uuid4().hex
+        part = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: text/csv\r\n\r\n{content.format(**state)}\r\n--{boundary}--\r\n"
+        )
+        return f"multipart/form-data; boundary={boundary}", part.encode()
+    fields = {
+        name: [item.format(**state) for item in value] if isinstance(value, list) else value.format(**state)
+        for name, value in payload.items()
+    }
+    return "application/x-www-form-urlencoded", urlencode(fields, doseq=True).encode()
+
+async def call(method, path, token=None, body=None):
+    # In-process ASGI request through the staging guard; the count is the X-DB-Commands it
+    # reports when the response starts, so a streamed body (the live feed) is not included
+    path, _, query = path.partition("?")
+    headers = [(b"cookie", f"access_token={token}".encode())] if token else []
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    if body is not None:
+        content_type, messages[0]["body"] = body
+        headers.append((b"content-type", content_type.encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": headers, "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+    }
+    started = asyncio.Event()
+    response = {}
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # Streams are read until the response has started, then the client goes away
+        await started.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {name.decode(): value.decode() for name, value in message["headers"]}
+            started.set()
+
+    await QueryBudgetMiddleware(app, budgets={})(scope, receive, send)
+    return response["status"], response["headers"], route_label(scope)
+
+async def settle():
+    # Regrades and roster imports run after the response; let them finish before the next request
+    tasks = [job.task for job in [*regrade.jobs.values(), *roster.jobs.values()] if job.task is not None]
+    await asyncio.gather(*tasks)
+
+async def seed_legacy(quiz, start, stop):
+    # Submissions stored before statistics were tracked, by the students _seed_submissions created
+    await submissions.collection.insert_many([
+        Submission(student_email=f"student{i}@example.com", quiz_id=quiz.id, answers=[i % 4] * len(quiz.questions),
+                   score=i % len(quiz.questions), submitted_at=datetime.utcnow()).to_mongo()
+        for i in range(start, stop)
+    ])
+
+@pytest.fixture
+def app_settings(monkeypatch):
+    # Tokens and admin signup work without a .env
+    monkeypatch.setattr(Config, "SECRET_KEY", "test-secret")
+    monkeypatch.setattr(Config, "ALGORITHM", "HS256")
+    monkeypatch.setattr(Config, "ADMIN_SECRET", "test-admin-secret")
+
+@pytest.fixture
+def pools():
+    yield
+    hash_pool.shutdown()
+    roster.roster_pool.shutdown()
+
+async def make_quiz(admin, title):
+    quiz = Quiz(
+        title=title, duration_minutes=30, code=uuid.uuid4().hex[:8].upper(), creator_email=admin.email,
+        questions=[QuestionEmbedded(text=f"Q{n}", options=["a", "b", "c", "d"], correct_option=n % 4) for n in range(10)],
+    )
+    await quizzes.insert(quiz)
+    return quiz
+
+def test_cases_cover_every_budgeted_route():
+    budgeted = {key for key, limit in ROUTE_BUDGETS.items() if limit is not None}
+    assert {(method, route) for method, route, *_ in CASES} == budgeted
+
+async def test_route_budgets_do_not_grow_with_submissions(db, app_settings, pools):
+    hashed = get_password_hash("pw")
+    admin = User(email="admin@example.com", name="Admin", hashed_password=hashed, role="admin")
+    await users.insert(admin)
+    quiz = await make_quiz(admin, "Budget")
+    legacy = await make_quiz(admin, "Legacy")
+    state = {"quiz_id": quiz.id, "legacy_id": legacy.id, "code": quiz.code, "admin_secret": Config.ADMIN_SECRET}
+    tokens = {"admin": create_access_token(admin.email)}
+    counts = {}
+    seeded = 0
+    for size in SIZES:
+        quiz = await quizzes.get(id=quiz.id)
+        await _seed_submissions(quiz, seeded, size)
+        await seed_legacy(legacy, seeded, size)
+        seeded = size
+        # A student with no submission yet, so enter_code, take_quiz and submit take the full path
+        pending = User(email=f"pending{size}@example.com", name="Pending", hashed_password=hashed, role="student")
+        await users.insert(pending)
+        tokens["student"] = create_access_token(pending.email)
+        state["size"] = size
+        for n, (method, route, path, role, body) in enumerate(CASES):
+            _clear_caches()
+            status, headers, label = await call(
+                method, (path or route).format(**state), tokens.get(role), body and encode(body, state)
+            )
+            await settle()
+            assert (label, status) == (route, status) and status < 400, f"{method} {path or route}: HTTP {status}"
+            if "job=" in headers.get("location", ""):
+                state["roster_job"] = headers["location"].split("job=")[1]
+            counts.setdefault(n, []).append(int(headers["x-db-commands"]))
+
+    over = []
+    for n, (method, route, path, _, _) in enumerate(CASES):
+        limit = ROUTE_BUDGETS[(method, route)]
+        if len(set(counts[n])) > 1 or max(counts[n]) > limit:
+            over.append(f"{method} {path or route}: {counts[n]} commands, budget {limit}")
+    assert over == []
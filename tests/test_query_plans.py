@@ -0,0 +1,153 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from models import QuestionEmbedded, Quiz, Submission, User
+from regrade import rebuild_stats
+from repository import decode_cursor, drafts, quiz_stats, quizzes, submissions, users
+
+pytestmark = pytest.mark.anyio
+
+# Session and routing fields the driver adds; explain takes the bare command
+DRIVER_FIELDS = {"lsid", "txnNumber", "writeConcern", "readConcern", "apiVersion", "apiStrict", "apiDeprecationErrors"}
+# One statement per explain: bulk updates and deletes are split up
+STATEMENTS = {"update": "updates", "delete": "deletes"}
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+
+def explainable(commands):
+    for name, command in commands:
+        if name not in EXPLAINABLE:
+            continue
+        bare = {key: value for key, value in command.items() if key not in DRIVER_FIELDS and not key.startswith("$")}
+        field = STATEMENTS.get(name)
+        if field is None:
+            yield bare
+            continue
+        for statement in bare[field]:
+            yield {**bare, field: [statement]}
+
+def problems(explain):
+    # Collection scans, in-memory sorts and un-indexed $lookup joins anywhere in the chosen plan
+    found = []
+    if isinstance(explain, dict):
+        if explain.get("stage") in ("COLLSCAN", "SORT"):
+            found.append(explain["stage"])
+        if explain.get("strategy") in ("NestedLoopJoin", "HashJoin"):
+            found.append(explain["strategy"])
+        for key, value in explain.items():
+            if key == "$sort":
+                found.append(key)
+            elif key not in ("command", "rejectedPlans"):
+                found += problems(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            found += problems(item)
+    return found
+
+async def seed(students=30):
+    quiz = Quiz(
+        title="Plans", duration_minutes=10, code=uuid.uuid4().hex[:8].upper(), creator_email="admin@example.com",
+        questions=[QuestionEmbedded(text=f"Q{n}", options=["a", "b", "c"], correct_option=n % 3) for n in range(3)],
+        modified_at=datetime.utcnow(),
+    )
+    await quizzes.insert(quiz)
+    for n in range(3):
+        await quizzes.insert(Quiz(title="Other", code=uuid.uuid4().hex[:8].upper(), creator_email=f"other{n}@example.com"))
+    started = datetime(2024, 5, 1, 9, 0)
+    for n in range(students):
+        await users.insert(User(email=f"s{n}@example.com", name=f"S{n}", role="student", school_id=str(n)))
+        await submissions.insert(Submission(
+            quiz_id=quiz.id, student_email=f"s{n}@example.com", answers=[n % 3, 1, 2], score=n % 4,
+            submitted_at=started + timedelta(minutes=n // 3),
+        ))
+    await drafts.upsert_many({(quiz.id, f"s{n}@example.com"): {0: 1} for n in range(students)}, datetime.utcnow())
+    await rebuild_stats(quiz)
+    return quiz
+
+async def repository_queries(quiz):
+    # What the routes and background jobs ask the repositories for
+    await users.get(email="s1@example.com")
+    await users.get(email="s1@example.com", role="student")
+    await users.exists(email="s1@example.com")
+    await users.profiles_by_email(["s1@example.com", "s2@example.com"])
+    await users.existing_emails(["s1@example.com", "new@example.com"])
+
+    await quizzes.get(id=quiz.id)
+    await quizzes.exists(id=quiz.id, creator_email=quiz.creator_email)
+    await quizzes.get_markers(str(quiz.id))
+    await quizzes.get_id_by_code(quiz.code)
+    await quizzes.get_version(quiz.id)
+    rows, next_cursor = await quizzes.list_for_creator(quiz.creator_email, limit=1)
+    await quizzes.list_for_creator(quiz.creator_email, before=ObjectId(), limit=1)
+    question = QuestionEmbedded(text="Q", options=["a", "b"], correct_option=1)
+    await quizzes.push_questions(str(quiz.id), [question])
+    await quizzes.set_question(str(quiz.id), 3, question)
+    await quizzes.remove_question(str(quiz.id), 3)
+
+    await submissions.get(quiz_id=quiz.id, student_email="s1@example.com")
+    await submissions.exists(quiz_id=quiz.id, student_email="s1@example.com")
+    await submissions.insert_once(Submission(quiz_id=quiz.id, student_email="s1@example.com", answers=[0], score=0))
+    await submissions.summary(quiz.id, 3, 100)
+    rows, next_cursor = await submissions.page_with_students(quiz.id, 3, 100, limit=5)
+    await submissions.page_with_students(quiz.id, 3, 100, before=decode_cursor(next_cursor), limit=5)
+    [pair async for pair in submissions.iter_with_students(quiz.id, batch_size=10)]
+    batches = [batch async for batch in submissions.iter_answer_batches(quiz.id, batch_size=10)]
+    await submissions.count_for_quiz(quiz.id)
+    await submissions.set_scores([(son["_id"], 1) for son in batches[0][:2]])
+    await submissions.drop_answer(quiz.id, 2, 1)
+
+    await quiz_stats.apply(quiz.id, {"count": 1, "score_sum": 1})
+    await quiz_stats.apply_many([(quiz.id, {"count": 1})])
+    await quiz_stats.counts_for_quizzes([quiz.id])
+    await quiz_stats.for_quizzes([quiz.id])
+    await rebuild_stats(await quizzes.get(id=quiz.id))
+
+    await drafts.upsert_many({(quiz.id, "s1@example.com"): {1: 2}}, datetime.utcnow())
+    await drafts.answers_for(quiz.id, "s1@example.com")
+    await drafts.delete_many([(quiz.id, "s1@example.com")])
+
+async def test_repository_queries_use_indexes(db, recorded_commands):
+    quiz = await seed()
+    recorded_commands.clear()
+    await repository_queries(quiz)
+
+    explained = failures = 0
+    report = []
+    for command in explainable(recorded_commands):
+        explain = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        explained += 1
+        found = problems(explain)
+        if found:
+            failures += 1
+            report.append(f"{sorted(set(found))}: {command}")
+    assert explained >= 30
+    assert not failures, "\n".join(report)
+
+def test_explainable_strips_driver_fields_and_splits_statements():
+    commands = [
+        ("find", {"find": "quiz", "filter": {"code": "X"}, "lsid": {}, "$db": "quiz_db"}),
+        ("update", {"update": "submission", "updates": [{"q": {"_id": 1}}, {"q": {"_id": 2}}], "ordered": False, "writeConcern": {}}),
+        ("insert", {"insert": "submission", "documents": [{}]}),
+        ("getMore", {"getMore": 1, "collection": "submission"}),
+    ]
+    assert list(explainable(commands)) == [
+        {"find": "quiz", "filter": {"code": "X"}},
+        {"update": "submission", "updates": [{"q": {"_id": 1}}], "ordered": False},
+        {"update": "submission", "updates": [{"q": {"_id": 2}}], "ordered": False},
+    ]
+
+def test_problems_look_at_the_winning_plan_only():
+    indexed = {
+        "queryPlanner": {
+            "winningPlan": {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}},
+            "rejectedPlans": [{"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}],
+        },
+        "command": {"aggregate": "quiz", "pipeline": [{"$sort": {"_id": -1}}]},
+    }
+    assert problems(indexed) == []
+    scan = {"queryPlanner": {"winningPlan": {"queryPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}}}}
+    assert problems(scan) == ["SORT", "COLLSCAN"]
+    unpushed = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {"stage": "IXSCAN"}}}}, {"$sort": {"sortKey": {}}}]}
+    assert problems(unpushed) == ["$sort"]
+    join = {"queryPlanner": {"winningPlan": {"stage": "EQ_LOOKUP", "strategy": "HashJoin", "inputStage": {"stage": "IXSCAN"}}}}
+    assert problems(join) == ["HashJoin"]
@@ -0,0 +1,41 @@
+import io
+import json
+from config import Config
+from question_import import parse_question_file
+
+def parse(filename, text):
+    return parse_question_file(filename, io.BytesIO(text.encode("utf-8")))
+
+def test_csv():
+    questions, errors = parse("q.CSV", "﻿text,correct_option,option_1,option_2,option_3\nTwo?,1,one,two,\nThree?,2,a,b,c\n")
+    assert errors == []
+    assert [(q.text, q.options, q.correct_option) for q in questions] == [
+        ("Two?", ["one", "two"], 1),
+        ("Three?", ["a", "b", "c"], 2),
+    ]
+
+def test_csv_reports_every_bad_row():
+    questions, errors = parse("q.csv", "text,correct_option,option_1,option_2\nOk?,0,a,b\n,0,a,b\nBad?,5,a,b\nNaN?,x,a,b\n")
+    assert len(questions) == 1
+    assert [error.split(":")[0] for error in errors] == ["line 3", "line 4", "line 5"]
+
+def test_jsonl_and_json():
+    row = {"text": "Q?", "options": ["a", "b"], "correct_option": 0}
+    questions, errors = parse("q.jsonl", json.dumps(row) + "\n\nnot json\n")
+    assert len(questions) == 1
+    assert errors[0].startswith("line 3:")
+    questions, errors = parse("q.json", json.dumps([row, row]))
+    assert (len(questions), errors) == (2, [])
+    assert parse("q.json", json.dumps(row)) == ([], ["file: expected a list of questions"])
+
+def test_unsupported_type_and_encoding():
+    assert parse("q.txt", "") == ([], ["unsupported file type, use .csv, .json or .jsonl"])
+    questions, errors = parse_question_file("q.csv", io.BytesIO(b"text,correct_option,option_1\n\xff\xfe,0,a\n"))
+    assert errors == ["file is not valid UTF-8"]
+
+def test_question_limit(monkeypatch):
+    monkeypatch.setattr(Config, "IMPORT_MAX_QUESTIONS", 2)
+    row = json.dumps({"text": "Q?", "options": ["a", "b"], "correct_option": 0})
+    questions, errors = parse("q.jsonl", "\n".join([row] * 3))
+    assert len(questions) == 2
+    assert errors == ["more than 2 questions"]
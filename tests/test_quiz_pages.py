@@ -0,0 +1,52 @@
+import gzip
+from bson import ObjectId
+from fastapi import Request
+from models import QuestionEmbedded, Quiz
+from quiz_cache import compile_quiz
+from quiz_pages import RenderedFragment, assemble_gzip, take_quiz_response
+from static_assets import accepted_encodings
+from templating import templates
+
+def test_assembled_gzip_decompresses_to_the_whole_page():
+    fragment = RenderedFragment(1, "<ol>" + "<li>Question é</li>" * 200 + "</ol>", compress=True)
+    prefix = "<html><body>".encode()
+    suffix = "</body></html>".encode()
+    body = assemble_gzip(prefix, fragment, suffix)
+    assert gzip.decompress(body) == prefix + fragment.raw + suffix
+
+def test_fragment_is_shared_between_pages():
+    fragment = RenderedFragment(1, "<p>shared</p>", compress=True)
+    first = assemble_gzip(b"<a>", fragment, b"</a>")
+    second = assemble_gzip(b"<b>longer prefix</b>", fragment, b"")
+    assert gzip.decompress(first) == b"<a><p>shared</p></a>"
+    assert gzip.decompress(second) == b"<b>longer prefix</b><p>shared</p>"
+
+def test_uncompressed_fragment():
+    fragment = RenderedFragment(2, "<p>x</p>", compress=False)
+    assert fragment.deflated is None
+    assert fragment.nbytes == len(b"<p>x</p>")
+
+def test_accepted_encodings_honour_q_values():
+    assert accepted_encodings("gzip, br;q=0.5") == {"gzip", "br"}
+    assert accepted_encodings("gzip;q=0") == set()
+    assert accepted_encodings("x-gzip-foo") == {"x-gzip-foo"}
+    assert accepted_encodings("x-gzip") == {"gzip"}
+    assert accepted_encodings("*, gzip;q=0") == {"br"}
+    assert accepted_encodings("GZIP; Q=0.1") == {"gzip"}
+    assert accepted_encodings("") == set()
+
+def take_quiz_page(accept_encoding):
+    quiz = Quiz(
+        id=ObjectId(), title="Encodings", duration_minutes=30, code="ENCODING", version=1,
+        questions=[QuestionEmbedded(text=f"Question {n}?", options=["a", "b", "c", "d"], correct_option=0) for n in range(30)],
+    )
+    request = Request({"type": "http", "method": "GET", "path": "/", "query_string": b"",
+                       "headers": [(b"accept-encoding", accept_encoding.encode())]})
+    return take_quiz_response(templates, request, compile_quiz(quiz))
+
+def test_pre_compressed_page_only_when_gzip_is_accepted():
+    assert take_quiz_page("gzip, deflate").headers.get("content-encoding") == "gzip"
+    for refused in ("gzip;q=0", "x-gzip-foo", "identity"):
+        response = take_quiz_page(refused)
+        assert "content-encoding" not in response.headers
+        assert response.body.startswith(b"<")
@@ -0,0 +1,89 @@
+import uuid
+from datetime import datetime
+import pytest
+from models import QuestionEmbedded, Quiz, Submission
+from regrade import rebuild_stats, regrade_quiz
+from repository import quiz_stats, quizzes, submissions
+
+pytestmark = pytest.mark.anyio
+
+ANSWERS = [[0, 1, 2], [0, 0, 2], [1, 0, 0], [2, 2, 2]]
+
+async def make_quiz(key):
+    quiz = Quiz(
+        title="Regrade", duration_minutes=10, code=uuid.uuid4().hex[:8].upper(), creator_email="admin@example.com",
+        total_points=30, questions=[QuestionEmbedded(text=f"Q{n}", options=["a", "b", "c"], correct_option=c) for n, c in enumerate(key)],
+    )
+    return await quizzes.insert(quiz)
+
+async def submit_all(quiz, key):
+    # Scored and counted against key, as submit_quiz does
+    for n, given in enumerate(ANSWERS):
+        score = sum(g == k for g, k in zip(given, key))
+        await submissions.insert(Submission(
+            quiz_id=quiz.id, student_email=f"s{n}@example.com", answers=given, score=score, submitted_at=datetime.utcnow(),
+        ))
+        await quiz_stats.apply(quiz.id, quiz_stats.increments(key, quiz.total_points, given, score))
+
+async def stored_scores(quiz):
+    return [s.score for s in await submissions.find(sort=[("student_email", 1)], quiz_id=quiz.id)]
+
+def totals(stats):
+    son = stats.to_mongo().to_dict()
+    son.pop("submissions_version", None)
+    return son
+
+async def test_rebuild_stats_rescores_against_the_current_key(db):
+    quiz = await make_quiz([0, 1, 2])
+    await submit_all(quiz, [0, 1, 2])
+    # The key changes without a regrade: stored scores and counters are stale
+    await quizzes.set_question(str(quiz.id), 1, QuestionEmbedded(text="Q1", options=["a", "b", "c"], correct_option=0))
+    quiz = await quizzes.get(id=quiz.id)
+
+    stats = await rebuild_stats(quiz, batch_size=3)
+    assert await stored_scores(quiz) == [2, 3, 1, 1]
+    stored = (await quiz_stats.for_quizzes([quiz.id]))[quiz.id]
+    assert totals(stored) == totals(stats)
+    assert stored.submissions_version > 0
+    assert (stats.count, stats.score_sum, stats.points_sum) == (4, 7, 70)
+    assert stats.score_histogram == {"3": 1, "2": 1, "1": 2}
+    assert stats.question_correct == {"0": 2, "1": 2, "2": 3}
+
+async def test_regrade_corrects_statistics_in_place(db, monkeypatch):
+    quiz = await make_quiz([0, 1, 2])
+    await submit_all(quiz, [0, 1, 2])
+    await quizzes.set_question(str(quiz.id), 1, QuestionEmbedded(text="Q1", options=["a", "b", "c"], correct_option=0))
+    quiz = await quizzes.get(id=quiz.id)
+
+    # A submission accepted while the regrade runs, after the scan has read its batch
+    set_scores = submissions.set_scores
+    async def set_scores_during_submit(scores):
+        await set_scores(scores)
+        late = Submission(quiz_id=quiz.id, student_email="late@example.com", answers=[0, 0, 0], score=2, submitted_at=datetime.utcnow())
+        await submissions.insert(late)
+        await quiz_stats.apply(quiz.id, quiz_stats.increments([0, 0, 2], quiz.total_points, late.answers, late.score))
+    monkeypatch.setattr(submissions, "set_scores", set_scores_during_submit)
+
+    assert await regrade_quiz(quiz, batch_size=10) == (4, 3)
+    assert await stored_scores(quiz) == [2, 2, 3, 1, 1]
+    stats = (await quiz_stats.for_quizzes([quiz.id]))[quiz.id]
+    assert (stats.count, stats.score_sum, stats.points_sum) == (5, 9, 90)
+    assert {score: n for score, n in stats.score_histogram.items() if n} == {"3": 1, "2": 2, "1": 2}
+    assert stats.question_correct == {"0": 3, "1": 3, "2": 3}
+
+async def test_regrade_counts_submissions_without_statistics(db):
+    quiz = await make_quiz([0, 0, 2])
+    for n, given in enumerate(ANSWERS):
+        await submissions.insert(Submission(quiz_id=quiz.id, student_email=f"s{n}@example.com", answers=given, score=0))
+    await regrade_quiz(quiz)
+    stats = (await quiz_stats.for_quizzes([quiz.id]))[quiz.id]
+    assert totals(stats) == totals(await rebuild_stats(quiz))
+
+async def test_regrade_treats_out_of_range_answers_as_unanswered(db):
+    quiz = await make_quiz([0, 1, 2])
+    # Stored before submit_quiz range-checked answers; too large for the int32 answer matrix
+    await submissions.insert(Submission(
+        quiz_id=quiz.id, student_email="s@example.com", answers=[0, 2**40, -7], score=3, submitted_at=datetime.utcnow(),
+    ))
+    assert await regrade_quiz(quiz) == (1, 1)
+    assert await stored_scores(quiz) == [1]
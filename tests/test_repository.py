@@ -0,0 +1,205 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from models import QuestionEmbedded, Quiz, QuizStats, Submission, User
+from repository import (
+    decode_cursor, drafts, encode_cursor, quiz_stats, quizzes, submissions, users,
+)
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2024, 5, 1, 9, 0)
+
+def question(correct, options=("a", "b", "c")):
+    return QuestionEmbedded(text=f"Pick {options[correct]}", options=list(options), correct_option=correct)
+
+async def make_quiz(creator="admin@example.com", code=None, questions=(0, 1, 2), total_points=100):
+    quiz = Quiz(
+        title="Quiz", duration_minutes=10, code=code or uuid.uuid4().hex[:8].upper(),
+        creator_email=creator, total_points=total_points, questions=[question(c) for c in questions],
+        modified_at=START,
+    )
+    return await quizzes.insert(quiz)
+
+async def submit(quiz, email, answers, score, minutes=0):
+    submission = Submission(
+        quiz_id=quiz.id, student_email=email, answers=answers, score=score,
+        submitted_at=START + timedelta(minutes=minutes),
+    )
+    return await submissions.insert_once(submission)
+
+def test_cursor_round_trip():
+    last_id = ObjectId()
+    assert decode_cursor(encode_cursor(START, last_id)) == (START, last_id)
+    assert decode_cursor("garbage") is None
+    assert decode_cursor(f"{START.isoformat()}_nope") is None
+
+async def test_get_exists_and_find(db):
+    await users.insert(User(email="ann@example.com", name="Ann", role="student", school_id="S1"))
+    await users.insert(User(email="bob@example.com", name="Bob", role="admin"))
+    ann = await users.get(email="ann@example.com")
+    assert (ann.name, ann.school_id) == ("Ann", "S1")
+    assert await users.exists(email="bob@example.com", role="admin")
+    assert not await users.exists(email="bob@example.com", role="student")
+    assert [u.email for u in await users.find(sort=[("email", -1)])] == ["bob@example.com", "ann@example.com"]
+    # Malformed ids behave like missing documents
+    assert await quizzes.get(id="not-an-id") is None
+    assert not await quizzes.exists(id="not-an-id")
+
+async def test_profiles_and_existing_emails(db):
+    await users.insert(User(email="ann@example.com", name="Ann", role="student", school_id="S1"))
+    profiles = await users.profiles_by_email(["ann@example.com", "cy@example.com"])
+    assert list(profiles) == ["ann@example.com"]
+    assert profiles["ann@example.com"]["school_id"] == "S1"
+    assert await users.existing_emails(["ann@example.com", "cy@example.com"]) == {"ann@example.com"}
+
+async def test_insert_once_keeps_the_first_submission(db):
+    quiz = await make_quiz()
+    first, created = await submit(quiz, "s@example.com", [0, 1, 2], 3)
+    again, created_again = await submit(quiz, "s@example.com", [1, 1, 1], 1)
+    assert (created, created_again) == (True, False)
+    assert again.id == first.id and again.score == 3
+    assert await submissions.count_for_quiz(quiz.id) == 1
+
+async def test_insert_many_once_reports_duplicates(db):
+    quiz = await make_quiz()
+    await submit(quiz, "a@example.com", [0], 1)
+    batch = [
+        Submission(quiz_id=quiz.id, student_email=email, answers=[0], score=1, submitted_at=START)
+        for email in ("a@example.com", "b@example.com", "b@example.com")
+    ]
+    assert await submissions.insert_many_once(batch) == [False, True, False]
+    assert batch[1].id is not None
+    assert await submissions.count_for_quiz(quiz.id) == 2
+
+async def test_list_for_creator_pages_newest_first(db):
+    created = [await make_quiz(questions=[0] * n) for n in range(5)]
+    await make_quiz(creator="other@example.com")
+    rows, next_cursor = await quizzes.list_for_creator("admin@example.com", limit=3)
+    assert [row["id"] for row in rows] == [q.id for q in reversed(created[2:])]
+    assert [row["question_count"] for row in rows] == [4, 3, 2]
+    assert "questions" not in rows[0]
+    rows, next_cursor = await quizzes.list_for_creator("admin@example.com", before=ObjectId(next_cursor), limit=3)
+    assert [row["id"] for row in rows] == [q.id for q in reversed(created[:2])]
+    assert next_cursor is None
+
+async def test_markers(db):
+    quiz = await make_quiz()
+    markers = await quizzes.get_markers(str(quiz.id))
+    assert markers["_id"] == quiz.id
+    assert markers["creator_email"] == "admin@example.com"
+    assert await quizzes.get_markers("not-an-id") is None
+    assert await quizzes.get_id_by_code(quiz.code) == quiz.id
+    assert await quizzes.get_version(quiz.id) == 0
+
+async def test_question_edits_bump_the_version(db):
+    quiz = await make_quiz(questions=(0, 1))
+    assert await quizzes.push_questions(str(quiz.id), [question(2), question(0)])
+    previous = await quizzes.set_question(str(quiz.id), 1, question(2))
+    assert previous.correct_option == 1
+    assert await quizzes.set_question(str(quiz.id), 9, question(2)) is None
+    assert await quizzes.remove_question(str(quiz.id), 0)
+    assert not await quizzes.remove_question(str(quiz.id), 9)
+    stored = await quizzes.get(id=quiz.id)
+    assert [q.correct_option for q in stored.questions] == [2, 2, 0]
+    assert stored.version == 3
+    assert not await quizzes.push_questions("not-an-id", [question(0)])
+
+async def test_summary_and_pages_with_students(db):
+    quiz = await make_quiz(questions=(0, 1, 2, 0), total_points=40)
+    await users.insert(User(email="s0@example.com", name="S0", role="student", school_id="ID0"))
+    for n in range(5):
+        await submit(quiz, f"s{n}@example.com", [0] * 4, n % 5, minutes=n // 2)
+    assert await submissions.summary(quiz.id, 4, 40) == {"total_students": 5, "avg_correct": 2.0, "avg_points": 20.0}
+    assert await submissions.summary(ObjectId(), 4, 40) == {"total_students": 0, "avg_correct": 0, "avg_points": 0}
+
+    seen = []
+    cursor = None
+    while True:
+        rows, next_cursor = await submissions.page_with_students(quiz.id, 4, 40, before=cursor, limit=2)
+        seen.extend(rows)
+        if next_cursor is None:
+            break
+        cursor = decode_cursor(next_cursor)
+    assert len(seen) == 5
+    order = [(row["submitted_at"], row["_id"]) for row in seen]
+    assert order == sorted(order, reverse=True)
+    first = next(row for row in seen if row["student_email"] == "s0@example.com")
+    assert (first["name"], first["school_id"], first["points_earned"]) == ("S0", "ID0", 0)
+    assert all("name" not in row for row in seen if row["student_email"] != "s0@example.com")
+
+async def test_iterators(db):
+    quiz = await make_quiz()
+    await users.insert(User(email="s1@example.com", name="S1", role="student"))
+    for n in range(5):
+        await submit(quiz, f"s{n}@example.com", [n % 3, 1, 2], n, minutes=n)
+    batches = [batch async for batch in submissions.iter_answer_batches(quiz.id, batch_size=2)]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert set(batches[0][0]) == {"_id", "answers", "score"}
+    pairs = [pair async for pair in submissions.iter_with_students(quiz.id, batch_size=2)]
+    assert [son["student_email"] for son, _ in pairs] == [f"s{n}@example.com" for n in reversed(range(5))]
+    assert {son["student_email"]: student and student["name"] for son, student in pairs}["s1@example.com"] == "S1"
+
+async def test_set_scores_and_drop_answer(db):
+    quiz = await make_quiz()
+    stored, _ = await submit(quiz, "a@example.com", [0, 1, 2], 3)
+    short, _ = await submit(quiz, "b@example.com", [0], 1)
+    # Submitted after the delete, against the quiz's new version: already aligned
+    late, _ = await submissions.insert_once(Submission(
+        quiz_id=quiz.id, student_email="c@example.com", answers=[0, 2], score=1, submitted_at=START, quiz_version=1,
+    ))
+    await submissions.set_scores([(stored.id, 2)])
+    await submissions.drop_answer(quiz.id, 1, 1)
+    assert (await submissions.get(id=stored.id)).answers == [0, 2]
+    assert (await submissions.get(id=stored.id)).score == 2
+    assert (await submissions.get(id=short.id)).answers == [0]
+    assert (await submissions.get(id=late.id)).answers == [0, 2]
+
+async def test_stats_increments(db):
+    quiz = await make_quiz(questions=(0, 1, 2), total_points=30)
+    key = [0, 1, 2]
+    assert quiz_stats.increments(key, 30, [0, 0, 2], 2) == {
+        "count": 1, "score_sum": 2, "points_sum": 20, "score_histogram.2": 1,
+        "question_correct.0": 1, "question_correct.2": 1,
+    }
+    answers = [[0, 1, 2], [0, 0, 2], [1, 0, 0]]
+    for n, given in enumerate(answers):
+        score = sum(g == k for g, k in zip(given, key))
+        await submit(quiz, f"s{n}@example.com", given, score)
+        if n == 0:
+            await quiz_stats.apply(quiz.id, quiz_stats.increments(key, 30, given, score))
+    await quiz_stats.apply_many([
+        (quiz.id, quiz_stats.increments(key, 30, given, sum(g == k for g, k in zip(given, key))))
+        for given in answers[1:]
+    ])
+    stats = (await quiz_stats.for_quizzes([quiz.id]))[quiz.id]
+    assert (stats.count, stats.score_sum, stats.points_sum) == (3, 5, 50)
+    assert stats.score_histogram == {"3": 1, "2": 1, "0": 1}
+    assert stats.question_correct == {"0": 2, "1": 1, "2": 2}
+    assert await quiz_stats.counts_for_quizzes([quiz.id, ObjectId()]) == ({quiz.id: 3}, {quiz.id: 3})
+    await quiz_stats.replace(QuizStats(quiz_id=quiz.id, count=4, score_sum=6, points_sum=60))
+    stats = (await quiz_stats.for_quizzes([quiz.id]))[quiz.id]
+    assert (stats.count, stats.score_sum, stats.submissions_version) == (4, 6, 4)
+    assert stats.score_histogram == {} and stats.question_correct == {}
+
+async def test_drafts(db):
+    quiz_id = ObjectId()
+    key = (quiz_id, "s@example.com")
+    # Recent: drafts expire a week after updated_at
+    now = datetime.utcnow()
+    await drafts.upsert_many({key: {0: 1, 2: 0}}, now)
+    await drafts.upsert_many({key: {2: 3}, (quiz_id, "t@example.com"): {1: 1}}, now)
+    assert await drafts.answers_for(quiz_id, "s@example.com") == {0: 1, 2: 3}
+    await drafts.delete_many([key])
+    assert await drafts.answers_for(quiz_id, "s@example.com") == {}
+    assert await drafts.answers_for(quiz_id, "t@example.com") == {1: 1}
+
+async def test_drafts_drop_answer(db):
+    quiz_id = ObjectId()
+    now = datetime.utcnow()
+    await drafts.upsert_many({(quiz_id, "s@example.com"): {0: 1, 1: 2, 3: 0}, (quiz_id, "t@example.com"): {0: 2}}, now)
+    await drafts.upsert_many({(ObjectId(), "s@example.com"): {3: 1}}, now)
+    await drafts.drop_answer(quiz_id, 1)
+    assert await drafts.answers_for(quiz_id, "s@example.com") == {0: 1, 2: 0}
+    assert await drafts.answers_for(quiz_id, "t@example.com") == {0: 2}
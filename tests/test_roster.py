@@ -0,0 +1,81 @@
+import asyncio
+import io
+import pytest
+import roster
+from config import Config
+from pool import BoundedPool
+from roster import RosterJob, parse_roster, take_credentials_csv
+
+def parse(text):
+    return parse_roster(io.BytesIO(text.encode("utf-8")))
+
+def test_rows_with_and_without_passwords():
+    rows, errors = parse("﻿School_ID,Name,Email,Password\nS1,Ann,Ann@Example.com,secret\nS2,Bob,bob@example.com,\n")
+    assert errors == []
+    assert [(r.line, r.school_id, r.name, r.email, r.password, r.generated) for r in rows] == [
+        (2, "S1", "Ann", "Ann@example.com", "secret", False),
+        (3, "S2", "Bob", "bob@example.com", None, True),
+    ]
+
+def test_bad_rows_do_not_stop_the_others():
+    rows, errors = parse("school_id,name,email\nS1,Ann,ann@example.com\nS2,,bob@example.com\nS3,Cy,not-an-email\nS4,Ann,ann@example.com\n")
+    assert [r.email for r in rows] == ["ann@example.com"]
+    assert [line for line, _, _ in errors] == [3, 4, 5]
+    assert errors[0] == (3, "bob@example.com", "school_id, name and email are required")
+    assert errors[1][1] == "not-an-email"
+    assert errors[2] == (5, "ann@example.com", "duplicate of line 2")
+
+def test_missing_columns():
+    assert parse("school_id,email\nS1,a@example.com\n") == ([], [(1, "", "missing column(s): name")])
+
+def test_row_limit(monkeypatch):
+    monkeypatch.setattr(Config, "ROSTER_MAX_ROWS", 1)
+    rows, errors = parse("school_id,name,email\nS1,A,a@example.com\nS2,B,b@example.com\n")
+    assert len(rows) == 1
+    assert errors == [(3, "", "more than 1 students")]
+
+def test_invalid_utf8():
+    rows, errors = parse_roster(io.BytesIO(b"school_id,name,email\nS1,\xff,a@example.com\n"))
+    assert errors == [(0, "", "file is not valid UTF-8")]
+
+class FakeUsers:
+    def __init__(self, existing=()):
+        self.existing = set(existing)
+        self.inserted = []
+
+    async def existing_emails(self, emails):
+        return self.existing & set(emails)
+
+    async def insert_many_once(self, documents):
+        self.inserted.extend(documents)
+        return [True] * len(documents)
+
+def hash_password(password):
+    return f"hashed:{password}"
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    # Room for one job at a time, so every concurrent hash has to wait for the slot
+    pool = BoundedPool("test-roster", max_workers=1, max_queue=0)
+    monkeypatch.setattr(roster, "roster_pool", pool)
+    monkeypatch.setattr(roster, "roster_slots", asyncio.Semaphore(1))
+    monkeypatch.setattr(roster, "get_password_hash", hash_password)
+    yield pool
+    pool.shutdown()
+
+@pytest.mark.anyio
+async def test_provisioning_waits_for_pool_capacity(monkeypatch, small_pool):
+    fake = FakeUsers(existing={"old@example.com"})
+    monkeypatch.setattr(roster, "users", fake)
+    rows, _ = parse("school_id,name,email,password\nS1,A,a@example.com,pw\nS2,B,b@example.com,\nS3,C,old@example.com,\nS4,D,d@example.com,\n")
+    job = RosterJob("admin@example.com", "r.csv")
+    await roster.provision_roster(rows, job, batch_size=10)
+    assert (job.done, job.created, job.skipped) == (4, 3, 1)
+    assert [user.hashed_password.startswith("hashed:") for user in fake.inserted] == [True, True, True]
+    assert [email for _, _, email, _ in job.credentials] == ["b@example.com", "d@example.com"]
+
+def test_credentials_are_handed_out_once():
+    job = RosterJob("admin@example.com", "r.csv")
+    job.credentials = [("S1", "Ann", "ann@example.com", "secret")]
+    assert take_credentials_csv(job).splitlines() == ["school_id,name,email,password", "S1,Ann,ann@example.com,secret"]
+    assert job.credentials == [] and job.credentials_downloaded
@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from bson import ObjectId
+import write_behind
+from models import Submission
+from write_behind import SubmissionWriter
+
+pytestmark = pytest.mark.anyio
+
+class FakeSubmissions:
+    def __init__(self):
+        self.stored = {}
+        self.batches = []
+
+    async def insert_many_once(self, batch):
+        self.batches.append(len(batch))
+        results = []
+        for submission in batch:
+            key = (submission.quiz_id, submission.student_email)
+            if key in self.stored:
+                results.append(False)
+            else:
+                submission.id = ObjectId()
+                self.stored[key] = submission
+                results.append(True)
+        return results
+
+    async def insert_once(self, submission):
+        created = (await self.insert_many_once([submission]))[0]
+        return self.stored[(submission.quiz_id, submission.student_email)], created
+
+    async def get(self, quiz_id, student_email):
+        return self.stored.get((quiz_id, student_email))
+
+class FakeStats:
+    def __init__(self):
+        self.applied = []
+
+    async def apply(self, quiz_id, inc):
+        self.applied.append((quiz_id, inc))
+
+    async def apply_many(self, incs):
+        self.applied.extend(incs)
+
+@pytest.fixture
+def repos(monkeypatch):
+    fakes = FakeSubmissions(), FakeStats()
+    monkeypatch.setattr(write_behind, "submissions", fakes[0])
+    monkeypatch.setattr(write_behind, "quiz_stats", fakes[1])
+    return fakes
+
+def submission(quiz_id, email):
+    return Submission(quiz_id=quiz_id, student_email=email, answers=[0], score=1)
+
+async def test_concurrent_saves_share_one_insert(repos):
+    fake_submissions, fake_stats = repos
+    quiz_id = ObjectId()
+    writer = SubmissionWriter(batch_size=100, max_delay=0.05)
+    writer.start()
+    try:
+        results = await asyncio.gather(*(
+            writer.save(submission(quiz_id, f"s{n}@example.com"), {"count": 1}) for n in range(20)
+        ))
+    finally:
+        await writer.stop()
+    assert all(created for _, created in results)
+    assert fake_submissions.batches == [20]
+    assert len(fake_stats.applied) == 20
+
+async def test_duplicate_returns_the_stored_submission(repos):
+    fake_submissions, fake_stats = repos
+    quiz_id = ObjectId()
+    writer = SubmissionWriter(batch_size=10, max_delay=0.01)
+    writer.start()
+    try:
+        first, created = await writer.save(submission(quiz_id, "s@example.com"), {"count": 1})
+        again, created_again = await writer.save(submission(quiz_id, "s@example.com"), {"count": 1})
+    finally:
+        await writer.stop()
+    assert (created, created_again) == (True, False)
+    assert again is first
+    assert len(fake_stats.applied) == 1
+
+async def test_batches_are_capped(repos):
+    fake_submissions, _ = repos
+    quiz_id = ObjectId()
+    writer = SubmissionWriter(batch_size=4, max_delay=0.05)
+    writer.start()
+    try:
+        await asyncio.gather(*(writer.save(submission(quiz_id, f"s{n}@example.com")) for n in range(10)))
+    finally:
+        await writer.stop()
+    assert sum(fake_submissions.batches) == 10
+    assert max(fake_submissions.batches) <= 4
+
+async def test_insert_failure_reaches_every_caller(repos, monkeypatch):
+    async def fail(batch):
+        raise ConnectionError("down")
+    monkeypatch.setattr(repos[0], "insert_many_once", fail)
+    writer = SubmissionWriter(batch_size=10, max_delay=0.01)
+    writer.start()
+    try:
+        results = await asyncio.gather(
+            *(writer.save(submission(ObjectId(), f"s{n}@example.com")) for n in range(3)), return_exceptions=True
+        )
+    finally:
+        await writer.stop()
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+async def test_without_start_saves_directly(repos):
+    fake_submissions, fake_stats = repos
+    stored, created = await SubmissionWriter().save(submission(ObjectId(), "s@example.com"), {"count": 1})
+    assert created and stored.id is not None
+    assert len(fake_stats.applied) == 1
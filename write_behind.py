@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from config import Config
+from metrics import Gauge, Histogram
+from repository import quiz_stats, submissions
+
+logger = logging.getLogger(__name__)
+
+writer_queue_depth = Gauge("submission_writer_queue_depth", "Submissions waiting to be flushed")
+writer_batch_size = Histogram(
+    "submission_writer_batch_size", "Submissions written per insert_many",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+writer_flush_seconds = Histogram("submission_writer_flush_seconds", "Time spent in a single insert_many flush")
+
+_STOP = object()
+
+# Batches submissions into insert_many calls. Callers wait until their batch is
+# written, so an acknowledged submission is always durable; the wait is bounded
+# by max_delay. A full queue makes callers wait for space (back-pressure).
+class SubmissionWriter:
+    def __init__(self, batch_size=500, max_delay=0.05, max_queue=5000):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.queue = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Flush everything already queued before the lifespan closes the database
+        if self._task is None:
+            return
+        await self.queue.put(_STOP)
+        await self._task
+        self._task = None
+        self.queue = None
+
+    async def save(self, submission, stats_inc=None):
+        # stats_inc is the quiz statistics $inc applied once the submission is known to be new
+        if self._task is None:
+            stored, created = await submissions.insert_once(submission)
+            if created and stats_inc:
+                await quiz_stats.apply(submission.quiz_id, stats_inc)
+            return stored, created
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((submission, stats_inc, future))
+        writer_queue_depth.set(self.queue.qsize())
+        created = await future
+        if created:
+            return submission, True
+        existing = await submissions.get(quiz_id=submission.quiz_id, student_email=submission.student_email)
+        return existing, False
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                if self.queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self.queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            writer_queue_depth.set(self.queue.qsize())
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        started = asyncio.get_running_loop().time()
+        try:
+            results = await submissions.insert_many_once([submission for submission, _, _ in batch])
+        except Exception as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            writer_batch_size.observe(len(batch))
+            writer_flush_seconds.observe(asyncio.get_running_loop().time() - started)
+        incs = [
+            (submission.quiz_id, stats_inc)
+            for (submission, stats_inc, _), result in zip(batch, results)
+            if result is True and stats_inc
+        ]
+        try:
+            await quiz_stats.apply_many(incs)
+        except Exception:
+            # The submissions are already durable; manage.py rebuild-stats repairs the counters
+            logger.exception("Failed to update quiz statistics for %d submissions", len(incs))
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+submission_writer = SubmissionWriter(
+    batch_size=Config.SUBMISSION_BATCH_SIZE,
+    max_delay=Config.SUBMISSION_MAX_ACK_DELAY,
+    max_queue=Config.SUBMISSION_QUEUE_SIZE,
+)